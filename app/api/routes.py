@@ -1,31 +1,179 @@
-from fastapi import APIRouter
-from app.models.schemas import OptimizationRequest, OptimizationResult, GetInitialConfig
-from app.services.milp_optimizer import milp_optimization
-from app.utils.helpers import read_json_input, input_is_valid
-from app.core.config import MAX_ITEMS, MAX_OPTIM_TIME
-from app.utils.courier_services import courier_list
+from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from app.models.schemas import (OptimizationRequest, OptimizationResult, ComparisonRequest, CourierComparison,
+                                ReoptimizationRequest, PhaseHistogram,
+                                JobStatus, CacheStats, GetInitialConfig)
+from app.services.solver_pool import solver_pool, SolverPoolBusy
+from app.services.jobs import job_store
+from app.services.result_cache import result_cache
+from app.services.comparison import compare_couriers
+from app.services.batch import solve_batch_async
+from app.services.incremental_optimizer import cart_after_changes
+from app.services.solver_backends import available_backends
+from app.utils.helpers import prepare_optimization
+from app.utils.timing import PhaseTimer, timing_metrics
+from app.utils.encoding import encode_json
+from app.core.config import MAX_ITEMS, MAX_OPTIM_TIME, SOLVER_RETRY_AFTER
+from app.utils.courier_services import couriers, courier_list, refresh_tariffs
 
 router = APIRouter()
 
-@router.post("/optimize", response_model=OptimizationResult)
+def busy_response():
+    return HTTPException(status_code=503,
+                         detail="Too many optimizations in progress, try again later.",
+                         headers={"Retry-After": str(SOLVER_RETRY_AFTER)})
+
+def json_response(result):
+    # Results are returned as they are, not validated again against the
+    # response model, which is only kept for the documentation
+    return Response(content=encode_json(result), media_type="application/json")
+
+def with_request_timings(result, timer, solved):
+    # Result with the phases of the request added to those of the
+    # optimization (when it was solved for this request, not cached), all
+    # recorded in the timing histograms
+    timings = dict(result["timings"]) if solved else {}
+    if solved:
+        timings["pool_wait"] = timer.phases["pool"] - timings.get("optimization", 0)
+        del timer.phases["pool"]
+    timings.update(timer.phases)
+    timings["request_total"] = sum(timer.phases.values()) + timings.get("pool_wait", 0) + timings.get("optimization", 0)
+    timing_metrics.observe(timings)
+    return json_response({**result, "timings": timings})
+
+@router.post("/optimize", response_model=None, responses={200: {"model": OptimizationResult}})
 async def optimize(data: OptimizationRequest):
-    key, purchased_items, selected_courier, fee_exemptions, discount_rate = read_json_input(data)
-    if not input_is_valid(key=key,
-                          items=purchased_items,
-                          courier=selected_courier,
-                          fee_exemptions=fee_exemptions,
-                          discount_rate=discount_rate):
-        return None
-    optimal_solution = milp_optimization(courier=selected_courier,
-                                         items=purchased_items,
-                                         discount_rate=discount_rate,
-                                         max_exemptions=fee_exemptions,
-                                         print_return_value=False)
-    result = optimal_solution.to_json()
-    return result
+    timer = PhaseTimer()
+    optimization = prepare_optimization(data)
+    timer.lap("prepare")
+    if optimization is None:
+        raise HTTPException(status_code=400, detail="Invalid inputs.")
+    method, kwargs = optimization
+    result = result_cache.get(method, kwargs)
+    timer.lap("cache")
+    if result is not None:
+        return with_request_timings(result, timer, solved=False)
+    # The solve runs in the process pool, so the event loop stays free
+    try:
+        result = await solver_pool.run(method, **kwargs)
+    except SolverPoolBusy:
+        raise busy_response()
+    timer.lap("pool")
+    result_cache.put(method, kwargs, result)
+    timer.lap("cache")
+    return with_request_timings(result, timer, solved=True)
+
+@router.post("/optimize/incremental", response_model=None, responses={200: {"model": OptimizationResult}})
+async def optimize_incremental(data: ReoptimizationRequest):
+    # Re-optimization of a cart changed by a few items, starting from the
+    # repaired previous solution
+    previous = data.previous.model_dump() if data.previous is not None else None
+    if previous is None and data.previous_job_id is not None:
+        job = job_store.get(data.previous_job_id)
+        previous = job.result if job is not None else None
+    if previous is None:
+        raise HTTPException(status_code=400, detail="Previous solution not found.")
+    previous_packages = [[(item["name"], item["price"], item["weight"]) for item in package["items"]]
+                         for package in previous["packages"]]
+    added = [(item.name, item.price, item.weight) for item in data.added]
+    items, previous_packing = cart_after_changes(previous_packages, added, data.removed)
+    if items is None:
+        raise HTTPException(status_code=400, detail="Removed items not in the previous solution.")
+    request = data.model_dump(exclude={"previous", "previous_job_id", "added", "removed"})
+    request["purchases"] = [{"name": item[0], "price": item[1], "weight": item[2]} for item in items]
+    optimization = prepare_optimization(request)
+    if optimization is None:
+        raise HTTPException(status_code=400, detail="Invalid inputs.")
+    method, kwargs = optimization
+    result = result_cache.get(method, kwargs)
+    if result is not None:
+        return json_response(result)
+    try:
+        result = await solver_pool.run("incremental", previous_packing=previous_packing,
+                                       solve=method == "milp", **kwargs)
+    except SolverPoolBusy:
+        raise busy_response()
+    # Only a proven optimum stands for the full solve of the cart
+    if method == "milp" and result["status"] == "Optimal":
+        result_cache.put(method, kwargs, result)
+    return json_response(result)
+
+@router.post("/optimize/compare", response_model=None, responses={200: {"model": List[CourierComparison]}})
+async def compare(data: ComparisonRequest):
+    optimizations = {}
+    for courier in couriers:
+        optimization = prepare_optimization({**data.model_dump(), "courier_service": courier})
+        if optimization is None:
+            raise HTTPException(status_code=400, detail="Invalid inputs.")
+        optimizations[courier] = optimization
+    try:
+        return json_response(await compare_couriers(optimizations))
+    except SolverPoolBusy:
+        raise busy_response()
+
+@router.post("/optimize/batch")
+async def optimize_batch(request: Request, time_limit: float = MAX_OPTIM_TIME):
+    # Body: JSONL of OptimizationRequest; response: JSONL of OptimizationResult
+    # (or {"error": ...}) streamed in the same order as the requests. The body
+    # is read first: a streaming response takes over the request's messages
+    time_limit = min(max(time_limit, 1), MAX_OPTIM_TIME)
+    lines = (await request.body()).splitlines()
+
+    async def result_lines():
+        async for result in solve_batch_async(lines, time_limit=time_limit):
+            yield encode_json(result) + b"\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(data: OptimizationRequest):
+    optimization = prepare_optimization(data)
+    if optimization is None:
+        raise HTTPException(status_code=400, detail="Invalid inputs.")
+    method, kwargs = optimization
+    try:
+        job = job_store.create(method, kwargs)
+    except SolverPoolBusy:
+        raise busy_response()
+    return job.to_json()
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_json()
+
+@router.post("/jobs/{job_id}/stop", response_model=JobStatus)
+async def stop_job(job_id: str):
+    # Ends the search of a job once its progress is good enough: the job
+    # finishes with the best solution found so far
+    job = job_store.stop(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_json()
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    job = job_store.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_json()
+
+@router.get("/metrics", response_model=Dict[str, PhaseHistogram])
+async def get_metrics():
+    # Histograms of the phase timings of the /optimize requests served
+    return timing_metrics.snapshot()
+
+@router.get("/cache/stats", response_model=CacheStats)
+async def get_cache_stats():
+    return result_cache.stats()
 
 @router.get("/initial_config", response_model=GetInitialConfig)
 async def get_initial_config():
+    refresh_tariffs()
     return {"couriers": courier_list,
             "max_items": MAX_ITEMS,
-            "max_optim_time": MAX_OPTIM_TIME}
\ No newline at end of file
+            "max_optim_time": MAX_OPTIM_TIME,
+            "solver_backends": available_backends()}
\ No newline at end of file
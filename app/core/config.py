@@ -1,3 +1,5 @@
+import os
+
 MAX_EXEMPTIONS_PER_YEAR = 3
 MAX_PRICE_EXEMPTION = 200   # USD
 MAX_WEIGHT_EXEMPTION = 20   # kg
@@ -13,4 +15,33 @@ WEIGHT_DECIMALS = 3
 LBS_PER_KG = 2.204623
 MAX_ITEMS = 20
 MAX_OPTIM_TIME = 30
-OPTIM_TIME_TOLERANCE = 0.01
\ No newline at end of file
+MILP_FORMULATIONS = ["bigm", "hull"]    # Tariff models: Big-M step indicators or convex hull
+DEFAULT_MILP_FORMULATION = "bigm"
+MILP_ASSEMBLIES = ["pulp", "matrix"]    # Model built from PuLP expressions or as arrays (with symmetry breaking only)
+DEFAULT_MILP_ASSEMBLY = "matrix"
+SOLVER_BACKENDS = ["cbc", "highs", "scipy"]   # MILP solvers: CBC binary, HiGHS (highspy) or SciPy's milp in process
+DEFAULT_SOLVER_BACKEND = os.environ.get("SOLVER_BACKEND", "cbc")
+DP_MAX_ITEMS = 18    # Largest cart of the DP optimizer, whose tables have 2^n entries (about 200 MB at 18 items)
+DECOMPOSITION_CANDIDATES = 40    # Packages the decomposition optimizer considers for the exemptions
+DECOMPOSITION_REFINED = 50       # Choices of exempted packages whose other packages get a local search
+INCREMENTAL_FREE_ITEMS = 10      # Items repacked by the MILP after a change of the cart (at least the touched ones)
+MAX_SOLVER_THREADS = os.cpu_count() or 1  # Threads a single solve may ask for
+SOLVER_THREADS = int(os.environ["SOLVER_THREADS"]) if "SOLVER_THREADS" in os.environ else None  # None: the solver's default
+MIP_GAP_REL = float(os.environ["MIP_GAP_REL"]) if "MIP_GAP_REL" in os.environ else None  # Relative gap that ends a solve
+MIP_GAP_ABS = float(os.environ["MIP_GAP_ABS"]) if "MIP_GAP_ABS" in os.environ else None  # Absolute gap (USD) that ends a solve
+DEBUG_OUTPUT_DIR = "output"   # Debug artifacts (LP model, solver log, variable values), opt-in
+SOLVER_WORKERS = int(os.environ.get("SOLVER_WORKERS", os.cpu_count() or 1))    # Solver processes of the API
+SOLVER_MAX_QUEUE = int(os.environ.get("SOLVER_MAX_QUEUE", 2 * SOLVER_WORKERS))  # Solves waiting for a process
+SOLVER_RETRY_AFTER = 5  # seconds, suggested to clients when the queue is full
+SOLVER_POLL_INTERVAL = 0.5  # seconds between attempts to enter the pool of solves that wait for room
+JOB_TTL = int(os.environ.get("JOB_TTL", 600))                # seconds a finished job is kept
+JOB_MAX_ACTIVE = int(os.environ.get("JOB_MAX_ACTIVE", 100))  # Jobs queued or running at once
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 1024))   # Results kept, 0 disables the cache
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 3600))     # seconds
+PACKAGE_COST_CACHE_SIZE = 2**16   # Single package costs memoized per process (see package_costs)
+TARIFF_FILE = os.environ.get("TARIFF_FILE", os.path.join(os.path.dirname(__file__), "..", "data", "tariffs.json"))
+TARIFF_CHECK_INTERVAL = float(os.environ.get("TARIFF_CHECK_INTERVAL", 1))   # seconds between checks of the tariff file
+TIMING_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60]  # seconds, phase histograms
+PROFILE_TOP_FUNCTIONS = 40    # Functions listed in the cProfile report of a request
+BATCH_CHECKPOINT_INTERVAL = 20    # Results written between two checkpoints of a batch
+BATCH_PROGRESS_INTERVAL = 10      # seconds between progress reports of a batch
@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from app.api.routes import router as api_router
+from app.services.solver_pool import solver_pool
+from app.services.jobs import job_store
 
 app = FastAPI()
 
+@app.on_event("shutdown")
+def shutdown_solver_pool():
+    solver_pool.shutdown()
+    job_store.shutdown()
+
 # Include the API routes
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
@@ -1,9 +1,15 @@
 from app.core.config import *
-#from app.utils.helpers import format_table
-import app.utils.helpers
 import json
+import os
+from array import array
+
+# Cost columns of the packages of a solution, in the order of the response
+PACKAGE_COLUMNS = ("price", "weight", "handling", "freight", "tax", "tfspu", "transport", "import_fee", "cost")
 
 class Package:
+    __slots__ = ("items", "total_price", "total_weight", "transport_cost",
+                 "import_fee", "import_fee_exempted", "total_package_cost")
+
     def __init__(self, items, total_price, total_weight, transport_cost,
                  import_fee, import_fee_exemption):
         self.items = items  # List of tuples (name, price, weight)
@@ -15,12 +21,23 @@ class Package:
         self.total_package_cost = transport_cost.total + import_fee
 
 class PackageSolution:
+    # The packages are not kept as objects: their items are stored one after
+    # the other in 'items', package k holding items[offsets[k]:offsets[k+1]],
+    # and their costs in one array per column of PACKAGE_COLUMNS. Package
+    # objects are only rebuilt for the text report (packages)
+    __slots__ = ("items", "offsets", "columns", "exempted", "total_weight", "total_price",
+                 "transport_cents", "total_import_fee", "total_cost", "courier_id", "courier",
+                 "solutions", "status", "time_spent", "timings")
+
     def __init__(self, courier_id, courier, status="", solutions=0, time_spent=0):
-        self.packages = []              # List of Package objects
+        self.items = []                 # Items (name, price, weight) of all packages
+        self.offsets = array("l", [0])  # Start of each package in items, and the end of the last one
+        self.columns = {column: array("d") for column in PACKAGE_COLUMNS}
+        self.exempted = array("b")      # Whether the import fee of each package is exempted
         self.total_weight = 0           # Total weight of all packages
         self.total_price = 0            # Total price of all packages
-        self.total_transport_cost = TransportCost.zero()
-                                        # Total transport cost of all packages
+        self.transport_cents = [0, 0, 0, 0, 0]
+                                        # Total transport cost of all packages, in cents
         self.total_import_fee = 0       # Total import fees of all packages
         self.total_cost = 0             # Total cost including transport and import fees
         self.courier_id = courier_id
@@ -28,19 +45,56 @@ class PackageSolution:
         self.solutions = solutions
         self.status = status
         self.time_spent = time_spent
+        self.timings = {}               # Seconds spent in each phase of the optimization
     
     def add_package(self, package):
-        self.packages.append(package)
+        self.items.extend(package.items)
+        self.offsets.append(len(self.items))
+        transport_cost = package.transport_cost
+        for column, value in zip(PACKAGE_COLUMNS, (package.total_price, package.total_weight,
+                                                  transport_cost.handling, transport_cost.freight,
+                                                  transport_cost.tax, transport_cost.TFSPU, transport_cost.total,
+                                                  package.import_fee, package.total_package_cost)):
+            self.columns[column].append(value)
+        self.exempted.append(bool(package.import_fee_exempted))
         self.total_weight += package.total_weight
         self.total_price += package.total_price
-        self.total_transport_cost += package.transport_cost
+        for k, cents in enumerate(transport_cost.cents):
+            self.transport_cents[k] += cents
         self.total_import_fee += package.import_fee
         self.total_cost += package.transport_cost.total + package.import_fee
+
+    @property
+    def total_transport_cost(self):
+        return TransportCost.from_cents(self.transport_cents)
+
+    @property
+    def num_packages(self):
+        return len(self.offsets) - 1
+
+    def package_items(self, k):
+        return self.items[self.offsets[k]:self.offsets[k + 1]]
+
+    @property
+    def packages(self):
+        packages = []
+        for k in range(self.num_packages):
+            costs = {column: values[k] for column, values in self.columns.items()}
+            transport_cost = TransportCost.from_cents(to_cents(costs[column]) for column in
+                                                      ("handling", "freight", "tax", "tfspu", "transport"))
+            packages.append(Package(items=self.package_items(k),
+                                    total_price=costs["price"],
+                                    total_weight=costs["weight"],
+                                    transport_cost=transport_cost,
+                                    import_fee=costs["import_fee"],
+                                    import_fee_exemption=bool(self.exempted[k])))
+        return packages
     
     def __str__(self):
+        import app.utils.helpers    # Not at the top: helpers imports the courier registry, which imports this module
         result  = f"{self.status} solution found for courier '{self.courier}' ({self.courier_id})\n\n"
         result += f"- Time spent: {self.time_spent:.2f} seconds\n"
-        num_packages = len(self.packages)
+        num_packages = self.num_packages
         result += f"- Packages: {num_packages}\n\n"
         result += 'PACKAGE DETAILS\n\n'
         for i, package in enumerate(self.packages):
@@ -75,81 +129,118 @@ class PackageSolution:
     def show(self):
         print(self)
     
-    def save_to_file(self, filename='solution_details.log'):
+    def save_to_file(self, filename='solution_details.log', directory=DEBUG_OUTPUT_DIR):
         try:
-            with open("output\\"+filename, 'w') as file:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, filename), 'w') as file:
                 print(self, file=file)
             print(f"File '{filename}' saved successfully.")
         except IOError as e:
             print(f"Error saving file '{filename}': {e}")
     
     def to_json(self, pretty=False):
+        columns = self.columns
+        total_transport_cost = self.total_transport_cost
+        packages = []
+        for k in range(self.num_packages):
+            package = {"package_id": k+1,
+                       "items": [{"name": name, "price": price, "weight": weight}
+                                 for name, price, weight in self.package_items(k)]}
+            for column in PACKAGE_COLUMNS:
+                package[column] = columns[column][k]
+            package["price"] = round(package["price"], COST_DECIMALS)
+            packages.append(package)
         result = {
             "status": self.status,
             "time_spent": self.time_spent,
-            "packages": [
-                {
-                    "package_id": i+1,
-                    "items": [
-                        {
-                            "name": item[0], "price": item[1], "weight": item[2]
-                        }
-                        for item in pkg.items],
-                    "price": round(pkg.total_price, COST_DECIMALS),
-                    "weight": pkg.total_weight,
-                    "handling": pkg.transport_cost.handling,
-                    "freight": pkg.transport_cost.freight,
-                    "tax": pkg.transport_cost.tax,
-                    "tfspu": pkg.transport_cost.TFSPU,
-                    "transport": pkg.transport_cost.total,
-                    "import_fee": pkg.import_fee,
-                    "cost": pkg.total_package_cost
-                }
-                for i, pkg in enumerate(self.packages)
-            ],
+            "packages": packages,
             "total_price": round(self.total_price, COST_DECIMALS),
             "total_weight": self.total_weight,
-            "total_handling": self.total_transport_cost.handling,
-            "total_freight": self.total_transport_cost.freight,
-            "total_tax": self.total_transport_cost.tax,
-            "total_tfspu": self.total_transport_cost.TFSPU,
-            "total_transport": self.total_transport_cost.total,
+            "total_handling": total_transport_cost.handling,
+            "total_freight": total_transport_cost.freight,
+            "total_tax": total_transport_cost.tax,
+            "total_tfspu": total_transport_cost.TFSPU,
+            "total_transport": total_transport_cost.total,
             "total_import_fee": self.total_import_fee,
-            "total_cost": round(self.total_cost, COST_DECIMALS)
+            "total_cost": round(self.total_cost, COST_DECIMALS),
+            "timings": self.timings
         }
         if pretty:
             result = json.dumps(result, indent=4)
         return result
 
+# TRANSPORT COSTS
+# ===============
+# A numeric transport cost keeps its components in whole cents (units of the
+# last of COST_DECIMALS): each one is rounded once, when the cost of a package
+# is computed, and sums of them are exact. The costs of the MILP models, PuLP
+# expressions, are TransportCostExpression instead.
+
+CENTS = 10**COST_DECIMALS
+
+def to_cents(amount):
+    # Amount in whole cents, rounded as round(amount, COST_DECIMALS)
+    return round(round(amount, COST_DECIMALS) * CENTS)
+
 class TransportCost:
+    # Immutable: the package cost oracle shares the same objects with every caller
+    __slots__ = ("cents",)  # (handling, freight, tax, TFSPU, total) in cents
+
     def __init__(self, handling, freight):
-        if isinstance(handling, (int, float)) and isinstance(freight, (int, float)):
-            self.handling = round(handling, COST_DECIMALS)
-            self.freight = round(freight, COST_DECIMALS)
-            self.tax = round(TAX_ON_FREIGHT * freight, COST_DECIMALS)
-            self.TFSPU = round(self.freight * TFSPU_RATE, COST_DECIMALS)
-            self.total = round(self.handling + self.freight + self.tax + self.TFSPU, COST_DECIMALS)
-        else:
-            self.handling = handling
-            self.freight = freight
-            self.tax = TAX_ON_FREIGHT * freight
-            self.TFSPU = self.freight * TFSPU_RATE
-            self.total = self.handling + self.freight + self.tax + self.TFSPU
-    
+        handling = to_cents(handling)
+        tax = to_cents(TAX_ON_FREIGHT * freight)
+        freight = round(freight, COST_DECIMALS)
+        TFSPU = to_cents(freight * TFSPU_RATE)
+        freight = to_cents(freight)
+        object.__setattr__(self, "cents", (handling, freight, tax, TFSPU, handling + freight + tax + TFSPU))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __reduce__(self):
+        return (TransportCost.from_cents, (self.cents,))
+
+    @classmethod
+    def from_cents(cls, cents):
+        cost = object.__new__(cls)
+        object.__setattr__(cost, "cents", tuple(cents))
+        return cost
+
     @classmethod
     def zero(cls):
-        return cls(handling=0, freight=0)
-    
+        return cls.from_cents((0, 0, 0, 0, 0))
+
+    @staticmethod
+    def total_of(handling, freight):
+        # Same value as TransportCost(handling, freight).total, without building the object
+        tax = to_cents(TAX_ON_FREIGHT * freight)
+        freight = round(freight, COST_DECIMALS)
+        return (to_cents(handling) + to_cents(freight) + tax + to_cents(freight * TFSPU_RATE)) / CENTS
+
+    @property
+    def handling(self):
+        return self.cents[0] / CENTS
+
+    @property
+    def freight(self):
+        return self.cents[1] / CENTS
+
+    @property
+    def tax(self):
+        return self.cents[2] / CENTS
+
+    @property
+    def TFSPU(self):
+        return self.cents[3] / CENTS
+
+    @property
+    def total(self):
+        return self.cents[4] / CENTS
+
     def __add__(self, other):
         if not isinstance(other, TransportCost):
             raise TypeError(f"Unsupported operand type(s) for +: '{type(self).__name__}' and '{type(other).__name__}'")
-        addition = object.__new__(TransportCost)
-        addition.handling = round(self.handling + other.handling, COST_DECIMALS)
-        addition.freight = round(self.freight + other.freight, COST_DECIMALS)
-        addition.tax = round(self.tax + other.tax, COST_DECIMALS)
-        addition.TFSPU = round(self.TFSPU + other.TFSPU, COST_DECIMALS)
-        addition.total = round(self.total + other.total, COST_DECIMALS)
-        return addition
+        return TransportCost.from_cents(a + b for a, b in zip(self.cents, other.cents))
 
     def __str__(self):
         output  = f'- Handling: USD {self.handling}\n'
@@ -162,3 +253,15 @@ class TransportCost:
 
     def show(self):
         print(self)
+
+class TransportCostExpression:
+    # Transport cost of a package of the MILP models, with PuLP expressions
+    # (or variables) for its handling and freight; nothing is rounded
+    __slots__ = ("handling", "freight", "tax", "TFSPU", "total")
+
+    def __init__(self, handling, freight):
+        self.handling = handling
+        self.freight = freight
+        self.tax = TAX_ON_FREIGHT * freight
+        self.TFSPU = freight * TFSPU_RATE
+        self.total = self.handling + self.freight + self.tax + self.TFSPU
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
+from app.core.config import (DEFAULT_MILP_FORMULATION, DEFAULT_SOLVER_BACKEND,
+                             SOLVER_THREADS, MIP_GAP_REL, MIP_GAP_ABS)
 
 class Item(BaseModel):
     name: str
@@ -25,6 +27,27 @@ class OptimizationRequest(BaseModel):
     courier_service: str
     import_fee_exemptions: int
     discount_rate: float
+    formulation: str = DEFAULT_MILP_FORMULATION
+    backend: str = DEFAULT_SOLVER_BACKEND   # MILP solver, one of SOLVER_BACKENDS
+    threads: Optional[int] = SOLVER_THREADS     # Solver threads, the solver's default if None
+    mip_gap: Optional[float] = MIP_GAP_REL      # Relative gap at which the solver stops
+    mip_gap_abs: Optional[float] = MIP_GAP_ABS  # Absolute gap (USD) at which the solver stops
+    fast: bool = False  # Return the packing heuristic's answer without solving the MILP
+    decomposition: bool = False # Solve with the decomposition heuristic instead of the MILP, much faster on large carts but not optimal
+    debug: bool = False # Write the model, solver log and variable values to a directory of the request
+    profile: bool = False   # Return a cProfile report of the optimization
+
+class ComparisonRequest(BaseModel):
+    key: str
+    purchases: List[Item]
+    import_fee_exemptions: int
+    discount_rate: float
+    formulation: str = DEFAULT_MILP_FORMULATION
+    backend: str = DEFAULT_SOLVER_BACKEND
+    threads: Optional[int] = SOLVER_THREADS
+    mip_gap: Optional[float] = MIP_GAP_REL
+    mip_gap_abs: Optional[float] = MIP_GAP_ABS
+    fast: bool = False
 
 class OptimizationResult(BaseModel):
     status: str
@@ -39,6 +62,57 @@ class OptimizationResult(BaseModel):
     total_transport: float
     total_import_fee: float
     total_cost: float
+    timings: Dict[str, float] = {}  # Seconds per phase: of the request and of the optimization
+    profile: Optional[str] = None
+
+class ReoptimizationRequest(BaseModel):
+    key: str
+    courier_service: str
+    import_fee_exemptions: int
+    discount_rate: float
+    previous: Optional[OptimizationResult] = None   # Previous solution of the cart,
+    previous_job_id: Optional[str] = None           #   or the job that computed it
+    added: List[Item] = []
+    removed: List[str] = []    # Names of the items removed, one item per name
+    formulation: str = DEFAULT_MILP_FORMULATION
+    backend: str = DEFAULT_SOLVER_BACKEND
+    threads: Optional[int] = SOLVER_THREADS
+    mip_gap: Optional[float] = MIP_GAP_REL
+    mip_gap_abs: Optional[float] = MIP_GAP_ABS
+    fast: bool = False  # Return the repaired packing without solving the MILP
+
+class CourierComparison(BaseModel):
+    courier_id: str
+    courier: str
+    lower_bound: float
+    skipped: bool   # Not solved exactly: it cannot beat the best courier (result from the heuristic)
+    result: OptimizationResult
+
+class SolverProgress(BaseModel):
+    incumbent: Optional[float] = None   # Cost of the best solution found by the solver
+    bound: Optional[float] = None       # Lower bound of the optimal cost
+    gap: Optional[float] = None         # (incumbent - bound) / incumbent
+    elapsed: float                      # Seconds of search
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    incumbent: Optional[OptimizationResult] = None
+    progress: Optional[SolverProgress] = None
+    result: Optional[OptimizationResult] = None
+    error: Optional[str] = None
+
+class CacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+class PhaseHistogram(BaseModel):
+    count: int
+    sum: float
+    buckets: Dict[str, int]     # Observations up to each bound (seconds), cumulative
 
 class Courier(BaseModel):
     id: str
@@ -48,3 +122,4 @@ class GetInitialConfig(BaseModel):
     couriers: List[Courier]
     max_items: int
     max_optim_time: int
+    solver_backends: List[str]  # Backends installed, of SOLVER_BACKENDS
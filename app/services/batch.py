@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from pydantic import ValidationError
+from app.core.config import *
+from app.models.schemas import OptimizationRequest
+from app.utils.helpers import prepare_optimization
+from app.utils.encoding import encode_json
+from app.services.solver_pool import SolverPool, solver_pool
+from app.services.result_cache import result_cache
+
+# Batches of carts: one OptimizationRequest per JSONL line in, one line out
+# per request and in the same order, either an OptimizationResult or
+# {"error": ...}. Blank lines are ignored.
+
+def read_record(line, time_limit):
+    # (method, kwargs, result) of a line; the result is already known when the
+    # line is not valid or the cart is in the result cache
+    try:
+        request = OptimizationRequest.model_validate_json(line)
+    except ValidationError as e:
+        return None, None, {"error": f"Invalid request: {e.errors()[0]['msg']}"}
+    optimization = prepare_optimization(request)
+    if optimization is None:
+        return None, None, {"error": "Invalid inputs."}
+    method, kwargs = optimization
+    if method == "milp":
+        kwargs["time_limit"] = time_limit
+    return method, kwargs, result_cache.get(method, kwargs)
+
+def record_result(method, kwargs, result, error=None):
+    if error is not None:
+        return {"error": str(error)}
+    result_cache.put(method, kwargs, result)
+    return result
+
+def solve_batch(lines, time_limit=MAX_OPTIM_TIME, workers=SOLVER_WORKERS):
+    # Yields the result of every line in order, while the following lines are
+    # solved ahead in a pool of processes of its own. The pool keeps room for
+    # solves that finished but whose release is still on its way
+    pool = SolverPool(workers=workers, max_queue=2 * workers)
+    pending = deque()
+
+    def next_result():
+        method, kwargs, future, result = pending.popleft()
+        if future is None:
+            return result
+        try:
+            return record_result(method, kwargs, future.result())
+        except Exception as e:
+            return record_result(method, kwargs, None, error=e)
+
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            method, kwargs, result = read_record(line, time_limit)
+            future = pool.submit(method, **kwargs) if result is None else None
+            pending.append((method, kwargs, future, result))
+            if len(pending) >= 2 * pool.workers:
+                yield next_result()
+        while pending:
+            yield next_result()
+    finally:
+        pool.shutdown()
+
+async def solve_batch_async(lines, time_limit=MAX_OPTIM_TIME):
+    # Same as solve_batch in the API's solver pool, taking at most one
+    # process per worker ahead of the line being returned
+    pending = deque()
+
+    async def next_result():
+        method, kwargs, future, result = pending.popleft()
+        if future is None:
+            return result
+        try:
+            return record_result(method, kwargs, await asyncio.wrap_future(future))
+        except Exception as e:
+            return record_result(method, kwargs, None, error=e)
+
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            method, kwargs, result = read_record(line, time_limit)
+            future = await solver_pool.submit_when_free(method, **kwargs) if result is None else None
+            pending.append((method, kwargs, future, result))
+            if len(pending) >= solver_pool.workers:
+                yield await next_result()
+        while pending:
+            yield await next_result()
+    finally:
+        # Solves of a client that went away are not started
+        for _, _, future, _ in pending:
+            if future is not None:
+                future.cancel()
+
+# CHECKPOINTS
+# ===========
+# A checkpoint records how many lines of the input have their result in the
+# output and the size of the output at that point, so that a batch that was
+# interrupted resumes from there (anything written after it is discarded)
+
+def load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return {"done": 0, "offset": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path, done, offset):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"done": done, "offset": offset}, f)
+    os.replace(temp_path, path)
+
+def run_batch(input_file, output_file, time_limit=MAX_OPTIM_TIME, workers=SOLVER_WORKERS,
+              checkpoint_path=None, progress_file=sys.stderr):
+    # Solves the lines of input_file into output_file (binary, seekable when
+    # there is a checkpoint) and returns the number of results written
+    checkpoint = load_checkpoint(checkpoint_path)
+    done = checkpoint["done"]
+    if checkpoint_path is not None:
+        output_file.seek(checkpoint["offset"])
+        output_file.truncate()
+    lines = islice((line for line in input_file if line.strip()), done, None)
+    start_time = last_report = time.time()
+    solved = errors = 0
+
+    def report():
+        elapsed = time.time() - start_time
+        print(f"{done} carts done ({solved / elapsed if elapsed else 0:.2f}/s in this run), {errors} errors",
+              file=progress_file, flush=True)
+
+    for result in solve_batch(lines, time_limit=time_limit, workers=workers):
+        output_file.write(encode_json(result) + b"\n")
+        done += 1
+        solved += 1
+        errors += "error" in result
+        if checkpoint_path is not None and done % BATCH_CHECKPOINT_INTERVAL == 0:
+            output_file.flush()
+            save_checkpoint(checkpoint_path, done, output_file.tell())
+        if time.time() - last_report >= BATCH_PROGRESS_INTERVAL:
+            last_report = time.time()
+            report()
+    output_file.flush()
+    if checkpoint_path is not None:
+        save_checkpoint(checkpoint_path, done, output_file.tell())
+    report()
+    return done
@@ -1,132 +1,127 @@
-from typing import List, Tuple, Callable
-from itertools import combinations
+import time
+from typing import List, Tuple, Iterator
+import numpy as np
 from app.core.config import *
 from app.utils.helpers import *
 from app.utils.courier_services import *
 from app.models.classes import *
+from app.utils.package_costs import import_fee_of, transport_total, build_package
+from app.services.dp_optimizer import (weight_grid_bound_table, remaining_transport_lower_bound,
+                                       remaining_fee_lower_bound, first_fit_decreasing)
 
 Item = Tuple[str, float, float]
 Pack = List[Item]
 Solution = List[Pack]
 
-def calculate_package_cost(items: List[Tuple[float, float]], 
-                           transport_cost_func: Callable[[float], float],
-                           is_exempt: bool) -> float:
-    total_price = sum(item[1] for item in items)
-    total_weight = sum(item[2] for item in items)
-    transport_cost = transport_cost_func(total_weight)#[0]+transport_cost_func(total_weight)[1]
-    import_fee = (max(IMPORT_FEE_PERCENT * total_price, MINIMUM_FEE_PAYMENT)) if not is_exempt else 0
-    return {"transport_cost": transport_cost,
-            "import_fee": import_fee,
-            "total_cost": transport_cost + import_fee}
-
 def package_valid(items: List[Tuple[float, float]]) -> bool:
     total_price = sum(item[1] for item in items)
     total_weight = sum(item[2] for item in items)
     return total_price <= MAX_PRICE_EXEMPTION and total_weight <= MAX_WEIGHT_EXEMPTION
 
-def brute_force_optimization(items,#: List[Item],
-                             courier,#: Callable[[float], float],
-                             max_exemptions=MAX_EXEMPTIONS_PER_YEAR):#: int = 3) -> Tuple[dict, List[dict]]:
+def fees_after_exemptions(fees: List[float], max_exemptions: int) -> float:
+    # The exemptions always go to the packages with the largest fees
+    if max_exemptions == 0:
+        return sum(fees)
+    return sum(sorted(fees)[:-max_exemptions])
+
+def brute_force_optimization(courier, items, discount_rate=0,
+                             max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
+                             print_return_value=False):
+    start_time = time.time()
     n = len(items)
-    best_solution = None
-    best_cost = float('inf')
-    transport_cost_func = couriers[courier]["cost_function"]
-    valid_solutions = []
+    if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
+        max_exemptions = MAX_EXEMPTIONS_PER_YEAR
+    elif max_exemptions < 0:
+        max_exemptions = 0
+
+    def partition_cost(prices: List[float], weights: List[float]) -> float:
+        return sum(transport_total(courier, weight) for weight in weights) \
+            + fees_after_exemptions([import_fee_of(price) for price in prices], max_exemptions)
+
+    # LOWER BOUNDS
+    # ============
+    # Total price and weight never change, so the cheapest possible cost of
+    # the items still to be placed only depends on the number of packages
+    # already opened: every package pays at least the transport bound line,
+    # and the fees are at least those of the open packages (which only grow)
+    total_price = sum(item[1] for item in items)
+    total_weight = sum(item[2] for item in items)
+    fee_floor = float(remaining_fee_lower_bound(np.array([total_price]), max_exemptions)[0])
+    bound_table = weight_grid_bound_table(courier, total_weight)
+    needed = max(np.ceil(total_weight / MAX_WEIGHT_EXEMPTION - MIN_TOLERANCE),
+                 np.ceil(total_price / MAX_PRICE_EXEMPTION - MIN_TOLERANCE), 1)
+    transport_floor = remaining_transport_lower_bound(np.full(n + 1, total_weight),
+                                                      np.maximum(np.arange(n + 1), needed),
+                                                      bound_table).tolist()
 
-    def backtrack(index: int, current_partition: Solution):
-        nonlocal best_solution, best_cost
+    def lower_bound(prices: List[float]) -> float:
+        fees = fees_after_exemptions([import_fee_of(price) for price in prices], max_exemptions)
+        return transport_floor[len(prices)] + max(fees, fee_floor)
+
+    # Items by decreasing price, so that the expensive ones open the packages
+    # and the bounds grow early in the search
+    order = sorted(range(n), key=lambda i: (-items[i][1], -items[i][2]))
+    best_partition = None
+    best_cost = float('inf')
+    packing = first_fit_decreasing(items)
+    if all(package_valid([items[i] for i in package]) for package in packing):
+        best_partition = [[items[i] for i in package] for package in packing]
+        best_cost = partition_cost([sum(item[1] for item in package) for package in best_partition],
+                                   [sum(item[2] for item in package) for package in best_partition])
+    solutions = 0
 
+    def backtrack(index: int, partition: Solution,
+                  prices: List[float], weights: List[float]) -> Iterator[Solution]:
+        # Yields the complete partitions that may still beat the incumbent;
+        # the partition is shared and only valid until the next item is drawn
+        if lower_bound(prices) >= best_cost:
+            return
         if index == n:
-            for exempt_combination in combinations(range(len(current_partition)), min(max_exemptions, len(current_partition))):
-                packages_info = []
-                total_transport_cost = 0
-                total_import_fee = 0
-                total_price = 0
-                total_weight = 0
-                for i, package in enumerate(current_partition):
-                    is_exempt = i in exempt_combination
-                    package_price = sum(item[1] for item in package)
-                    package_weight = sum(item[2] for item in package)
-                    cost_breakdown = calculate_package_cost(package, transport_cost_func, is_exempt)
-                    packages_info.append({"items": [{"name": item[0], "price": item[1], "weight": item[2]} for item in package],
-                                          "is_exempt": is_exempt,
-                                          "total_price": package_price,
-                                          "total_weight": package_weight,
-                                          "transport_cost": cost_breakdown["transport_cost"],
-                                          "import_fee": cost_breakdown["import_fee"],
-                                          "total_cost": cost_breakdown["total_cost"]})
-                    total_transport_cost += cost_breakdown["transport_cost"]
-                    total_import_fee += cost_breakdown["import_fee"]
-                    total_price += package_price
-                    total_weight += package_weight
-                total_cost = total_transport_cost + total_import_fee
-                solution_info = {"packages": packages_info,
-                                 "total_price": total_price,
-                                 "total_weight": total_weight,
-                                 "total_transport_cost": total_transport_cost,
-                                 "total_import_fee": total_import_fee,
-                                 "total_cost": total_cost}
-                valid_solutions.append(solution_info)
-                if total_cost < best_cost:
-                    best_cost = total_cost
-                    best_solution = solution_info
+            yield partition
             return
-        for package in current_partition:
-            package.append(items[index])
-            if package_valid(package):
-                backtrack(index + 1, current_partition)
-            package.pop()
-        current_partition.append([items[index]])
-        backtrack(index + 1, current_partition)
-        current_partition.pop()
-    backtrack(0, [])
-    optimal_solution = PackageSolution(courier=courier, solutions=len(valid_solutions))
-    for package in best_solution["packages"]:
-        assigned_items = [(items["name"], items["price"], items["weight"]) for items in package["items"]]
-        total_price = package["total_price"]
-        total_weight = package["total_weight"]
-        transport_cost = package["transport_cost"]
-        import_fee = package["import_fee"]
-        import_fee_exemption = package["is_exempt"]
-        package = Package(items=assigned_items,
-                          total_price=total_price,
-                          total_weight=total_weight,
-                          transport_cost=transport_cost,
-                          import_fee=import_fee,
-                          import_fee_exemption=import_fee_exemption)
-        optimal_solution.add_package(package)
-    print(f"** Objective function optimal value = {optimal_solution.total_cost}")
-    return optimal_solution
+        item = items[order[index]]
+        for j, package in enumerate(partition):
+            if prices[j] + item[1] <= MAX_PRICE_EXEMPTION and weights[j] + item[2] <= MAX_WEIGHT_EXEMPTION:
+                package.append(item)
+                prices[j] += item[1]
+                weights[j] += item[2]
+                yield from backtrack(index + 1, partition, prices, weights)
+                prices[j] -= item[1]
+                weights[j] -= item[2]
+                package.pop()
+        if item[1] <= MAX_PRICE_EXEMPTION and item[2] <= MAX_WEIGHT_EXEMPTION:
+            partition.append([item])
+            prices.append(item[1])
+            weights.append(item[2])
+            yield from backtrack(index + 1, partition, prices, weights)
+            weights.pop()
+            prices.pop()
+            partition.pop()
 
-def print_results(optimal_solution, all_solutions, courier_service):
-    print(f"Optimization using courier {courier_service}")
-    print()
-    print("Optimal packaging solution:")
-    print()
-    for i, package in enumerate(optimal_solution["packages"]):
-        print(f"* Package {i+1}:")
-        print("  ==========\n")
-        print("  Items included:")
-        for n, item in enumerate(package["items"]):
-            print(f"    {n+1}. {item['name']} (USD {item['price']}, {item['weight']} kg)")
-        print()
-        print(f"  Package price:       USD {package['total_price']:.2f}")
-        print(f"  Package weight:          {package['total_weight']:.2f} kg")
-        print(f"  Transport cost:      USD {package['transport_cost']:.2f}")
-        print(f"  Import fee:          USD {package['import_fee']:.2f}"+(" (fee exempted)" if package['is_exempt'] else ""))
-        print()
-        print(f"  Total package cost:  USD {package['total_cost']:.2f}")
-        print()
-    print("---")
-    print("Totals:")
-    print()
-    print(f"Total price:           USD {optimal_solution['total_price']:.2f}")
-    print(f"Total weight:              {optimal_solution['total_weight']:.2f} kg")
-    print()
-    print(f"Total transport cost:  USD {optimal_solution['total_transport_cost']:.2f}")
-    print(f"Total import fee:      USD {optimal_solution['total_import_fee']:.2f}")
-    print()
-    print(f"Total cost:            USD {optimal_solution['total_cost']:.2f}")
-    print()
-    print(f"Valid solutions analyzed: {len(all_solutions)}")
+    for partition in backtrack(0, [], [], []):
+        solutions += 1
+        cost = partition_cost([sum(item[1] for item in package) for package in partition],
+                              [sum(item[2] for item in package) for package in partition])
+        if cost < best_cost:
+            best_cost = cost
+            best_partition = [list(package) for package in partition]
+    solver_time = time.time() - start_time
+    if best_partition is None:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Infeasible",
+                               solutions=solutions,
+                               time_spent=solver_time)
+    if print_return_value:
+        print(f"\n** Objective function value = {best_cost:.2f}\n")
+    optimal_solution = PackageSolution(courier_id=courier,
+                                       courier=couriers[courier]["name"],
+                                       status="Optimal",
+                                       solutions=solutions,
+                                       time_spent=solver_time)
+    fees = [import_fee_of(sum(item[1] for item in package)) for package in best_partition]
+    exempted = sorted(range(len(fees)), key=lambda j: -fees[j])[:max_exemptions]
+    for j, package in enumerate(best_partition):
+        assigned_items = [(item[0], item[1], item[2]) for item in package]
+        optimal_solution.add_package(build_package(courier, assigned_items, exempt=j in exempted))
+    return optimal_solution
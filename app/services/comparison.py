@@ -0,0 +1,70 @@
+import asyncio
+from math import inf
+from app.core.config import *
+from app.utils.helpers import *
+from app.utils.courier_services import couriers
+from app.services.dp_optimizer import cart_lower_bound
+from app.services.solver_pool import solver_pool, heuristic_arguments
+from app.services.result_cache import result_cache
+
+def result_cost(result):
+    if result is None or result["status"] in ("Infeasible", "Not Solved"):
+        return inf
+    return result["total_cost"]
+
+async def compare_couriers(optimizations):
+    # optimizations: {courier: (method, kwargs)} for the same cart.
+    # Every courier first gets the packing heuristic's answer, an upper bound
+    # of its cost; couriers whose lower bound (cart_lower_bound) exceeds the
+    # best cost found so far are skipped, the rest are solved in parallel
+    # in the solver pool, cheapest lower bound first.
+    lower_bounds = {courier: cart_lower_bound(courier, kwargs["items"], kwargs["max_exemptions"])
+                    for courier, (method, kwargs) in optimizations.items()}
+    futures = {}
+    for courier, (method, kwargs) in optimizations.items():
+        if futures:
+            futures[courier] = await solver_pool.submit_when_free("heuristic", **heuristic_arguments(kwargs))
+        else:
+            # A busy pool turns the whole comparison away (SolverPoolBusy)
+            futures[courier] = solver_pool.submit("heuristic", **heuristic_arguments(kwargs))
+    heuristic = {courier: await asyncio.wrap_future(future) for courier, future in futures.items()}
+    best = min(result_cost(result) for result in heuristic.values())
+    results = {}
+    skipped = set()
+    tasks = {}
+    for courier in sorted(optimizations, key=lambda courier: lower_bounds[courier]):
+        method, kwargs = optimizations[courier]
+        if method == "heuristic":
+            results[courier] = heuristic[courier]
+        elif lower_bounds[courier] > best + MIN_TOLERANCE:
+            skipped.add(courier)
+        else:
+            results[courier] = result_cache.get(method, kwargs)
+            if results[courier] is None:
+                future = await solver_pool.submit_when_free(method, **kwargs)
+                tasks[asyncio.wrap_future(future)] = (courier, future)
+            else:
+                best = min(best, result_cost(results[courier]))
+    while tasks:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            courier, future = tasks.pop(task)
+            method, kwargs = optimizations[courier]
+            results[courier] = task.result()
+            result_cache.put(method, kwargs, results[courier])
+            best = min(best, result_cost(results[courier]))
+        # Solves not started yet that can no longer win are dropped
+        for task, (courier, future) in list(tasks.items()):
+            if lower_bounds[courier] > best + MIN_TOLERANCE and future.cancel():
+                del tasks[task]
+                skipped.add(courier)
+    # Skipped couriers keep the heuristic's answer
+    for courier in skipped:
+        results[courier] = heuristic[courier]
+    ranking = sorted(optimizations, key=lambda courier: (result_cost(results[courier]), lower_bounds[courier]))
+    return [{"courier_id": courier,
+             "courier": couriers[courier]["name"],
+             "lower_bound": round(lower_bounds[courier], COST_DECIMALS),
+             "skipped": courier in skipped,
+             "result": results[courier]}
+            for courier in ranking]
@@ -0,0 +1,161 @@
+import time
+from itertools import combinations
+import numpy as np
+from app.core.config import *
+from app.models.classes import *
+from app.utils.courier_services import *
+from app.utils.package_costs import import_fee_of, transport_total, build_package
+from app.services.dp_optimizer import (first_fit_decreasing, packages_needed, remaining_transport_lower_bound,
+                                       remaining_fee_lower_bound, weight_grid_bound_table, cart_lower_bound)
+from app.services.heuristic_optimizer import PackingEvaluator, local_search, heuristic_packing
+
+# DECOMPOSITION
+# =============
+# The exemptions only waive the import fee of up to max_exemptions packages,
+# so the problem splits in two levels. The outer level chooses the exempted
+# packages, which only cost their transport, among candidates that carry as
+# much price as the caps allow. The inner level packs the other items with no
+# exemption at all, where each package pays its transport and its import fee.
+# Outer choices are taken by increasing lower bound of their total cost (the
+# transport of the exempted packages plus a bin packing bound of the rest)
+# and the inner level is only packed, by first fit decreasing and local
+# search, for the choices whose bound is below the best cost found.
+# A heuristic: the candidates are limited and the inner packings are not
+# optimal, so that small carts end up a few percent above the optimum. The
+# result is only "Optimal" when it meets cart_lower_bound or is forced.
+
+def exempt_candidates(items, packings):
+    # Packages worth exempting, as bitmasks: those of the given packings and,
+    # from every item, the package filled greedily by decreasing price or by
+    # decreasing price per kg. The ones with the largest import fee are kept
+    candidates = {sum(1 << i for i in package) for packing in packings for package in packing}
+    orders = [sorted(range(len(items)), key=lambda i: -items[i][1]),
+              sorted(range(len(items)), key=lambda i: -items[i][1] / max(items[i][2], MIN_TOLERANCE))]
+    for seed in range(len(items)):
+        for order in orders:
+            package, price, weight = 1 << seed, items[seed][1], items[seed][2]
+            for i in order:
+                if not package >> i & 1 and price + items[i][1] <= MAX_PRICE_EXEMPTION \
+                        and weight + items[i][2] <= MAX_WEIGHT_EXEMPTION:
+                    package |= 1 << i
+                    price += items[i][1]
+                    weight += items[i][2]
+            candidates.add(package)
+    fits = lambda package: sum(items[i][1] for i in bits(package)) <= MAX_PRICE_EXEMPTION \
+        and sum(items[i][2] for i in bits(package)) <= MAX_WEIGHT_EXEMPTION
+    fee = lambda package: import_fee_of(sum(items[i][1] for i in bits(package)))
+    weight = lambda package: sum(items[i][2] for i in bits(package))
+    candidates = sorted((package for package in candidates if fits(package)), key=lambda p: (-fee(p), weight(p)))
+    return candidates[:DECOMPOSITION_CANDIDATES]
+
+def bits(mask):
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+def union(masks):
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+def inner_packing(courier, items, rest, refine=False):
+    # Packing of the items of the mask 'rest' with no exemption and its cost:
+    # first fit decreasing, followed by local search when refine is set
+    indexes = bits(rest)
+    if not indexes:
+        return [], 0
+    sub_items = [items[i] for i in indexes]
+    evaluator = PackingEvaluator(courier, sub_items, 0)
+    packing = first_fit_decreasing(sub_items)
+    if not all(evaluator.fits(package) for package in packing):
+        return None, np.inf
+    if refine:
+        packing, cost = local_search(packing, evaluator)
+    else:
+        cost = evaluator.cost(packing)
+    return [[indexes[i] for i in package] for package in packing], cost
+
+def decomposition_optimization(courier, items, discount_rate=0,
+                               max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
+                               print_return_value=False,
+                               time_limit=MAX_OPTIM_TIME):
+    start_time = time.time()
+    num_items = len(items)
+    if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
+        max_exemptions = MAX_EXEMPTIONS_PER_YEAR
+    elif max_exemptions < 0:
+        max_exemptions = 0
+    packing, best_cost, _ = heuristic_packing(courier, items, max_exemptions)
+    if packing is None:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Infeasible",
+                               time_spent=time.time() - start_time)
+    # OUTER LEVEL: EXEMPTED PACKAGES
+    # ==============================
+    candidates = exempt_candidates(items, [packing, first_fit_decreasing(items)])
+    price = np.array([sum(items[i][1] for i in bits(package)) for package in candidates])
+    weight = np.array([sum(items[i][2] for i in bits(package)) for package in candidates])
+    transport = np.array([transport_total(courier, w) for w in weight])
+    total_price = sum(item[1] for item in items)
+    total_weight = sum(item[2] for item in items)
+    choices = [combination for size in range(min(max_exemptions, len(candidates)) + 1)
+               for combination in combinations(range(len(candidates)), size)
+               if sum(candidates[j].bit_count() for j in combination)
+               == union(candidates[j] for j in combination).bit_count()]
+    # Lower bound of each choice: transport of its packages, and the import
+    # fee and transport that the rest of the items cannot go below
+    chosen = np.zeros((len(choices), len(candidates)))
+    for row, combination in enumerate(choices):
+        chosen[row, list(combination)] = 1
+    rest_price = np.maximum(total_price - chosen @ price, 0)
+    rest_weight = np.maximum(total_weight - chosen @ weight, 0)
+    bound_table = weight_grid_bound_table(courier, total_weight)
+    bounds = chosen @ transport + remaining_fee_lower_bound(rest_price, 0) \
+        + remaining_transport_lower_bound(rest_weight, packages_needed(rest_price, rest_weight), bound_table)
+    # INNER LEVEL: PACKING OF THE REST
+    # ================================
+    # Every choice whose bound is below the best cost known gets a quick
+    # packing of the rest; the most promising ones are then refined
+    full = (1 << num_items) - 1
+    screened = []
+    for row in np.argsort(bounds, kind="stable"):
+        if bounds[row] >= best_cost - MIN_TOLERANCE or time.time() - start_time > time_limit:
+            break
+        rest = full ^ union(candidates[j] for j in choices[row])
+        _, rest_cost = inner_packing(courier, items, rest)
+        screened.append((transport[list(choices[row])].sum() + rest_cost, row))
+    screened.sort()
+    for _, row in screened[:DECOMPOSITION_REFINED]:
+        if time.time() - start_time > time_limit:
+            break
+        exempted = [candidates[j] for j in choices[row]]
+        rest_packing, rest_cost = inner_packing(courier, items, full ^ union(exempted), refine=True)
+        cost = transport[list(choices[row])].sum() + rest_cost
+        if cost < best_cost - MIN_TOLERANCE:
+            best_cost = cost
+            packing = [bits(package) for package in exempted] + rest_packing
+    # The exemptions go back to the packages with the largest fees, and a last
+    # local search may move items between the two levels
+    evaluator = PackingEvaluator(courier, items, max_exemptions)
+    packing, best_cost = local_search(packing, evaluator)
+    packing = sorted([sorted(package) for package in packing])
+    exempted = evaluator.exempted(packing)
+    solver_time = time.time() - start_time
+    if print_return_value:
+        print(f"\n** Objective function value = {best_cost:.2f}\n")
+    # Optimal when the bound is met, or when the packing is the only one there
+    # is: one package per item (or no item) and no two of them fit together,
+    # where the bound is loose
+    forced = all(len(package) == 1 for package in packing) \
+        and not any(evaluator.fits(first + second) for first, second in combinations(packing, 2))
+    status = "Optimal" if forced or best_cost <= cart_lower_bound(courier, items, max_exemptions) + MIN_TOLERANCE \
+        else "Heuristic"
+    solution = PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status=status,
+                               solutions=len(screened),
+                               time_spent=solver_time)
+    for j, package in enumerate(packing):
+        assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in package]
+        solution.add_package(build_package(courier, assigned_items, exempt=j in exempted))
+    return solution
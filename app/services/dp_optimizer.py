@@ -0,0 +1,257 @@
+import time
+import numpy as np
+from app.core.config import *
+from app.models.classes import *
+from app.utils.courier_services import *
+from app.utils.package_costs import build_package
+
+PAIRS_PER_CHUNK = 2**22    # (state, package) pairs evaluated per vectorized step
+
+def subset_sums(values):
+    # sums[S] = sum of values[i] for every bit i set in S
+    sums = np.zeros(1)
+    for value in values:
+        sums = np.concatenate([sums, sums + value])
+    return sums
+
+TRANSPORT_BOUND_SLOPES = 16
+TRANSPORT_BOUND_GRID = 0.05    # kg
+
+def transport_bound_table(package_weight, package_transport):
+    # For a few slopes b and every weight W on a grid, the largest a such that
+    # transport >= a + b * weight holds for every package lighter than W.
+    # Lines with a >= 0 can be summed over the packages of a group of items.
+    positive = package_weight > 0
+    package_weight = package_weight[positive]
+    package_transport = package_transport[positive]
+    grid = np.arange(0, MAX_WEIGHT_EXEMPTION + TRANSPORT_BOUND_GRID, TRANSPORT_BOUND_GRID)
+    max_slope = (package_transport / package_weight).max() if len(package_weight) else 0
+    slopes = np.linspace(0, max_slope, TRANSPORT_BOUND_SLOPES)
+    bucket = np.minimum(np.searchsorted(grid, package_weight), len(grid) - 1)
+    intercepts = np.full((len(slopes), len(grid)), np.inf)
+    for line, slope in enumerate(slopes):
+        np.minimum.at(intercepts[line], bucket, package_transport - slope * package_weight)
+    intercepts = np.minimum.accumulate(intercepts, axis=1)
+    return grid, slopes, intercepts
+
+def remaining_transport_lower_bound(weight, num_packages, bound_table):
+    # Items with the given total weight carried in at least num_packages packages
+    grid, slopes, intercepts = bound_table
+    intercepts = intercepts[:, np.minimum(np.searchsorted(grid, weight), len(grid) - 1)]
+    bound = np.where(intercepts >= 0,
+                     intercepts * num_packages[None, :] + slopes[:, None] * weight[None, :],
+                     -np.inf).max(axis=0)
+    return np.where(weight > 0, np.maximum(bound, 0), 0)
+
+def remaining_fee_lower_bound(price, exemptions):
+    # Items with the given total price need ceil(price/MAX_PRICE_EXEMPTION)
+    # packages; apart from the exempted ones, each pays at least
+    # MINIMUM_FEE_PAYMENT and together at least IMPORT_FEE_PERCENT of the
+    # price they carry
+    packages_by_price = np.ceil(price / MAX_PRICE_EXEMPTION - MIN_TOLERANCE)
+    fee = np.maximum(MINIMUM_FEE_PAYMENT * np.maximum(packages_by_price - exemptions, 0),
+                     IMPORT_FEE_PERCENT * np.maximum(price - exemptions * MAX_PRICE_EXEMPTION, 0))
+    return np.where(price > 0, fee, 0)
+
+def packages_needed(price, weight, count_price=True):
+    needed = np.maximum(np.ceil(weight / MAX_WEIGHT_EXEMPTION - MIN_TOLERANCE), 1)
+    if count_price:
+        needed = np.maximum(needed, np.ceil(price / MAX_PRICE_EXEMPTION - MIN_TOLERANCE))
+    return needed
+
+def weight_grid_bound_table(courier, max_weight):
+    # transport_bound_table of a courier over every weight up to max_weight
+    grid = np.arange(1, int(round(min(max_weight, MAX_WEIGHT_EXEMPTION) * 10**WEIGHT_DECIMALS)) + 1) \
+        / 10**WEIGHT_DECIMALS
+    grid_cost = batch_cost(courier, grid)
+    valid = ~np.isnan(grid_cost)
+    return transport_bound_table(grid[valid], grid_cost[valid])
+
+def cart_lower_bound(courier, items, max_exemptions=MAX_EXEMPTIONS_PER_YEAR):
+    # Cost that no packing of the items can go below with this courier
+    price = np.array([sum(item[1] for item in items)])
+    weight = np.array([sum(item[2] for item in items)])
+    needed = packages_needed(price, weight, count_price=all(item[2] > 0 for item in items))
+    transport = remaining_transport_lower_bound(weight, needed, weight_grid_bound_table(courier, weight[0]))
+    return float(transport[0] + remaining_fee_lower_bound(price, max_exemptions)[0])
+
+def first_fit_decreasing(items):
+    # Quick feasible packing: items by decreasing price into the first
+    # package that keeps both the price and the weight caps
+    order = sorted(range(len(items)), key=lambda i: (-items[i][1], -items[i][2]))
+    packages = []
+    for i in order:
+        for package in packages:
+            if package[1] + items[i][1] <= MAX_PRICE_EXEMPTION \
+                    and package[2] + items[i][2] <= MAX_WEIGHT_EXEMPTION:
+                package[0].append(i)
+                package[1] += items[i][1]
+                package[2] += items[i][2]
+                break
+        else:
+            packages.append([[i], items[i][1], items[i][2]])
+    return [package[0] for package in packages]
+
+def dp_optimization(courier, items, discount_rate=0,
+                    max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
+                    print_return_value=False,
+                    time_limit=MAX_OPTIM_TIME):
+    # Carts over DP_MAX_ITEMS items, and searches over the time limit, are
+    # not solved: the tables and the time grow as 2^n
+    start_time = time.time()
+    num_items = len(items)
+    if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
+        max_exemptions = MAX_EXEMPTIONS_PER_YEAR
+    elif max_exemptions < 0:
+        max_exemptions = 0
+    if num_items == 0:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Optimal",
+                               time_spent=time.time() - start_time)
+    if num_items > DP_MAX_ITEMS:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Not Solved",
+                               time_spent=time.time() - start_time)
+    full = (1 << num_items) - 1
+    # COST OF EVERY SUBSET OF ITEMS AS A SINGLE PACKAGE
+    # ================================================
+    price = np.round(subset_sums([item[1] for item in items]), COST_DECIMALS)
+    weight = np.round(subset_sums([item[2] for item in items]), WEIGHT_DECIMALS)
+    feasible = (price <= MAX_PRICE_EXEMPTION) & (weight <= MAX_WEIGHT_EXEMPTION)
+    feasible[0] = False
+    packages = np.flatnonzero(feasible)
+    transport = batch_cost(courier, weight[packages])
+    packages = packages[~np.isnan(transport)]
+    transport = transport[~np.isnan(transport)]
+    package_price = price[packages]
+    import_fee = np.where(package_price > 0,
+                          np.maximum(IMPORT_FEE_PERCENT * package_price, MINIMUM_FEE_PAYMENT), 0)
+    cost_exempt = np.full(full + 1, np.inf)
+    cost_exempt[packages] = transport
+    cost_not_exempt = np.full(full + 1, np.inf)
+    cost_not_exempt[packages] = transport + import_fee
+    package_fee = np.zeros(full + 1)
+    package_fee[packages] = import_fee
+    bound_table = transport_bound_table(weight[packages], transport)
+    weighted_items = all(item[2] > 0 for item in items)
+    # Upper bound from quick packings (first fit decreasing, one item per
+    # package), exempting the largest fees; states that cannot beat it are dropped
+    upper_bound = np.inf
+    for packing in [first_fit_decreasing(items), [[i] for i in range(num_items)]]:
+        subsets = np.array([sum(1 << i for i in package) for package in packing])
+        if not np.isfinite(cost_exempt[subsets]).all():
+            continue
+        fees = np.sort(package_fee[subsets])[::-1]
+        upper_bound = min(upper_bound, cost_exempt[subsets].sum() + fees[max_exemptions:].sum() + MIN_TOLERANCE)
+    # DYNAMIC PROGRAMMING OVER SUBSETS
+    # ================================
+    # best[k][S]: cheapest packing of the items in S using exactly k exemptions.
+    # A package is always added around the lowest item not yet packed, so the
+    # states are processed in layers by that item and each partition is built once.
+    best = np.full((max_exemptions + 1, full + 1), np.inf)
+    best[0][0] = 0
+
+    def relax(source, package):
+        target = source | package
+        for k in range(max_exemptions, -1, -1):
+            candidate = best[k][source] + cost_not_exempt[package]
+            if k > 0:
+                candidate = np.minimum(candidate, best[k-1][source] + cost_exempt[package])
+            np.minimum.at(best[k], target, candidate)
+
+    lowest_item = np.log2(packages & -packages).astype(int)
+    for i in range(num_items):
+        if time.time() - start_time > time_limit:
+            return PackageSolution(courier_id=courier,
+                                   courier=couriers[courier]["name"],
+                                   status="Not Solved",
+                                   time_spent=time.time() - start_time)
+        bit = 1 << i
+        layer_packages = packages[lowest_item == i]
+        states = (bit - 1) | (np.arange(1 << (num_items - i - 1)) << (i + 1))
+        states = states[np.isfinite(best[:, states]).any(axis=0)]
+        # Drop the states that cannot beat the upper bound with the exemptions
+        # they have left, and finish every state whose unpacked items fit in a
+        # single package; those finished solutions tighten the upper bound
+        rest = full ^ states
+        needed = packages_needed(price[rest], weight[rest], count_price=weighted_items)
+        transport_one = remaining_transport_lower_bound(weight[rest], needed, bound_table)
+        fees = [remaining_fee_lower_bound(price[rest], max_exemptions - k) for k in range(max_exemptions + 1)]
+        for k in range(max_exemptions + 1):
+            best[k][states[best[k][states] + fees[k] + transport_one > upper_bound]] = np.inf
+        alive = np.isfinite(best[:, states]).any(axis=0)
+        states = states[alive]
+        rest = rest[alive]
+        last = np.isfinite(cost_exempt[rest])
+        relax(states[last], rest[last])
+        upper_bound = min(upper_bound, best[:, full].min() + MIN_TOLERANCE)
+        # Only the states that could still beat it with two or more packages go on
+        transport_more = remaining_transport_lower_bound(weight[rest], np.maximum(needed[alive], 2), bound_table)
+        split = np.zeros(len(states), dtype=bool)
+        for k in range(max_exemptions + 1):
+            split |= best[k][states] + fees[k][alive] + transport_more <= upper_bound
+        states = states[split]
+        if len(layer_packages) == 0 or len(states) == 0:
+            continue
+        # Packages for a state are taken either by scanning every package of the
+        # layer or by enumerating the subsets of its unpacked items, whichever is shorter
+        free_items = np.bitwise_count((full ^ states) ^ bit).astype(int)
+        by_subsets = (1 << free_items) < len(layer_packages)
+        scanned = states[~by_subsets]
+        chunk = max(1, PAIRS_PER_CHUNK // len(layer_packages))
+        for first in range(0, len(scanned), chunk):
+            source = scanned[first:first+chunk, None]
+            source_index, package_index = np.nonzero((source & layer_packages[None, :]) == 0)
+            relax(source[source_index, 0], layer_packages[package_index])
+        for num_free in np.unique(free_items[by_subsets]):
+            group = states[by_subsets & (free_items == num_free)]
+            combinations = (np.arange(1 << num_free)[:, None] >> np.arange(num_free)) & 1
+            chunk = max(1, PAIRS_PER_CHUNK >> num_free)
+            for first in range(0, len(group), chunk):
+                source = group[first:first+chunk]
+                free = ((full ^ source) ^ bit)[:, None] >> np.arange(num_items) & 1
+                free_bits = (1 << np.nonzero(free)[1]).reshape(len(source), num_free)
+                package = bit | (free_bits @ combinations.T)
+                source = np.repeat(source, 1 << num_free)
+                package = package.ravel()
+                usable = np.isfinite(cost_exempt[package])
+                relax(source[usable], package[usable])
+    solver_time = time.time() - start_time
+    # RECONSTRUCTION
+    # ==============
+    k = int(np.argmin(best[:, full]))
+    if not np.isfinite(best[k][full]):
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Infeasible",
+                               time_spent=solver_time)
+    if print_return_value:
+        print(f"\n** Objective function value = {best[k][full]:.2f}\n")
+    optimal_solution = PackageSolution(courier_id=courier,
+                                       courier=couriers[courier]["name"],
+                                       status="Optimal",
+                                       time_spent=solver_time)
+    state = full
+    while state:
+        candidates = packages[(packages & ~state) == 0]
+        remaining = state ^ candidates
+        not_exempt = best[k][remaining] + cost_not_exempt[candidates] == best[k][state]
+        if k > 0:
+            exempt = best[k-1][remaining] + cost_exempt[candidates] == best[k][state]
+        else:
+            exempt = np.zeros(len(candidates), dtype=bool)
+        if not_exempt.any():
+            position = np.flatnonzero(not_exempt)[0]
+            is_exempt = False
+        else:
+            position = np.flatnonzero(exempt)[0]
+            is_exempt = True
+        package_subset = int(candidates[position])
+        assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in range(num_items)
+                          if package_subset >> i & 1]
+        optimal_solution.add_package(build_package(courier, assigned_items, exempt=is_exempt))
+        state = int(remaining[position])
+        k -= is_exempt
+    return optimal_solution
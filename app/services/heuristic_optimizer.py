@@ -0,0 +1,106 @@
+import time
+from app.core.config import *
+from app.models.classes import *
+from app.utils.courier_services import *
+from app.utils.package_costs import import_fee_of, transport_total, build_package
+from app.services.dp_optimizer import first_fit_decreasing
+
+MAX_LOCAL_SEARCH_PASSES = 50
+
+class PackingEvaluator:
+    # Cost of a packing (lists of item indexes) with the exemptions given to
+    # the packages with the largest import fees
+    def __init__(self, courier, items, max_exemptions):
+        self.items = items
+        self.max_exemptions = max_exemptions
+        self.courier = courier
+
+    def transport(self, weight):
+        return transport_total(self.courier, weight)
+
+    def fits(self, package):
+        return sum(self.items[i][1] for i in package) <= MAX_PRICE_EXEMPTION \
+            and sum(self.items[i][2] for i in package) <= MAX_WEIGHT_EXEMPTION
+
+    def exempted(self, packing):
+        fees = [import_fee_of(sum(self.items[i][1] for i in package)) for package in packing]
+        return sorted(range(len(packing)), key=lambda j: -fees[j])[:self.max_exemptions]
+
+    def cost(self, packing):
+        fees = sorted(import_fee_of(sum(self.items[i][1] for i in package)) for package in packing)
+        return sum(self.transport(sum(self.items[i][2] for i in package)) for package in packing) \
+            + sum(fees[:max(len(fees) - self.max_exemptions, 0)])
+
+def neighbours(packing, evaluator):
+    # Packings reachable by moving one item to another (or a new) package, or
+    # by swapping two items of different packages
+    for a in range(len(packing)):
+        for item in packing[a]:
+            rest = [i for i in packing[a] if i != item]
+            for b in range(len(packing) + 1):
+                if b == a or (b == len(packing) and not rest):
+                    continue
+                target = packing[b] + [item] if b < len(packing) else [item]
+                if evaluator.fits(target):
+                    others = [package for k, package in enumerate(packing) if k not in (a, b)]
+                    yield others + [target] + ([rest] if rest else [])
+    for a in range(len(packing)):
+        for b in range(a + 1, len(packing)):
+            for item_a in packing[a]:
+                for item_b in packing[b]:
+                    first = [i for i in packing[a] if i != item_a] + [item_b]
+                    second = [i for i in packing[b] if i != item_b] + [item_a]
+                    if evaluator.fits(first) and evaluator.fits(second):
+                        others = [package for k, package in enumerate(packing) if k not in (a, b)]
+                        yield others + [first, second]
+
+def local_search(packing, evaluator):
+    # First improvement descent over the neighbours of the packing
+    best_cost = evaluator.cost(packing)
+    for _ in range(MAX_LOCAL_SEARCH_PASSES):
+        for candidate in neighbours(packing, evaluator):
+            cost = evaluator.cost(candidate)
+            if cost < best_cost - MIN_TOLERANCE:
+                packing, best_cost = candidate, cost
+                break
+        else:
+            break
+    return packing, best_cost
+
+def heuristic_packing(courier, items, max_exemptions=MAX_EXEMPTIONS_PER_YEAR):
+    # First fit decreasing followed by local search; None if some item does
+    # not fit in a package on its own
+    evaluator = PackingEvaluator(courier, items, max_exemptions)
+    packing = first_fit_decreasing(items)
+    if not all(evaluator.fits(package) for package in packing):
+        return None, None, []
+    packing, cost = local_search(packing, evaluator)
+    # Packages ordered by their first item
+    packing = sorted([sorted(package) for package in packing])
+    return packing, cost, evaluator.exempted(packing)
+
+def heuristic_optimization(courier, items, discount_rate=0,
+                           max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
+                           print_return_value=False):
+    start_time = time.time()
+    if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
+        max_exemptions = MAX_EXEMPTIONS_PER_YEAR
+    elif max_exemptions < 0:
+        max_exemptions = 0
+    packing, cost, exempted = heuristic_packing(courier, items, max_exemptions)
+    solver_time = time.time() - start_time
+    if packing is None:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Infeasible",
+                               time_spent=solver_time)
+    if print_return_value:
+        print(f"\n** Objective function value = {cost:.2f}\n")
+    solution = PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Heuristic",
+                               time_spent=solver_time)
+    for j, package in enumerate(packing):
+        assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in package]
+        solution.add_package(build_package(courier, assigned_items, exempt=j in exempted))
+    return solution
@@ -0,0 +1,149 @@
+import time
+from app.core.config import *
+from app.models.classes import *
+from app.utils.courier_services import *
+from app.utils.package_costs import build_package
+from app.services.heuristic_optimizer import PackingEvaluator, local_search
+from app.services.dp_optimizer import cart_lower_bound
+
+# INCREMENTAL RE-OPTIMIZATION
+# ===========================
+# After a small change of the cart most packages of the previous solution are
+# still good: the previous packing is repaired, and returned as optimal if it
+# meets the lower bound of the cart. Otherwise the MILP only repacks the items
+# of the packages that the repair changed, and of the smallest other packages
+# up to INCREMENTAL_FREE_ITEMS items, the rest staying as they are: a fraction
+# of a full solve, but not proven optimal.
+
+def cart_after_changes(previous_packages, added, removed):
+    # Items of the new cart and the previous packing over their indexes, from
+    # the previous packages (lists of items), the items added and the names
+    # of the items removed (one item per name given). None if a removed item
+    # is not in the previous cart
+    removed = list(removed)
+    items = []
+    packing = []
+    for package in previous_packages:
+        kept = []
+        for item in package:
+            if item[0] in removed:
+                removed.remove(item[0])
+            else:
+                kept.append(len(items))
+                items.append(item)
+        if kept:
+            packing.append(kept)
+    if removed:
+        return None, None
+    return items + list(added), packing
+
+def repair_packing(courier, items, packing, max_exemptions=MAX_EXEMPTIONS_PER_YEAR):
+    # Previous packing (without the items removed) completed with the items it
+    # misses, each one put where it adds the least cost, then improved by the
+    # heuristic's local search. Returns (packing, cost, exempted) like
+    # heuristic_packing
+    evaluator = PackingEvaluator(courier, items, max_exemptions)
+    packing = [list(package) for package in packing if evaluator.fits(package)]
+    placed = {i for package in packing for i in package}
+    for i in sorted(set(range(len(items))) - placed, key=lambda i: (-items[i][1], -items[i][2])):
+        if not evaluator.fits([i]):
+            return None, None, []
+        candidates = [packing[:j] + [package + [i]] + packing[j + 1:]
+                      for j, package in enumerate(packing) if evaluator.fits(package + [i])]
+        packing = min(candidates + [packing + [[i]]], key=evaluator.cost)
+    packing, cost = local_search(packing, evaluator)
+    # Packages ordered by their first item
+    packing = sorted([sorted(package) for package in packing])
+    return packing, cost, evaluator.exempted(packing)
+
+def touched_packages(packing, previous_packing):
+    # Indexes of the packages of the packing that the previous one does not have
+    previous = {frozenset(package) for package in previous_packing}
+    return [j for j, package in enumerate(packing) if frozenset(package) not in previous]
+
+def freed_packages(packing, previous_packing, max_items=INCREMENTAL_FREE_ITEMS):
+    # The touched packages and, by increasing size, the other packages that
+    # keep the items of them all within max_items
+    freed = touched_packages(packing, previous_packing)
+    num_items = sum(len(packing[j]) for j in freed)
+    for j in sorted(set(range(len(packing))) - set(freed), key=lambda j: (len(packing[j]), j)):
+        if num_items + len(packing[j]) > max_items:
+            break
+        freed.append(j)
+        num_items += len(packing[j])
+    return freed
+
+def repack_freed(courier, items, packing, previous_packing, max_exemptions, **milp_options):
+    # The MILP over the items of the freed packages, warm started with them,
+    # with the exemptions that the other packages leave. Returns the packing
+    # of all the items with those packages repacked and the MILP solution
+    evaluator = PackingEvaluator(courier, items, max_exemptions)
+    freed = freed_packages(packing, previous_packing)
+    free = sorted(i for j in freed for i in packing[j])
+    kept = [package for j, package in enumerate(packing) if j not in freed]
+    kept_exemptions = sum(1 for j in evaluator.exempted(packing) if j not in freed)
+    index = {i: k for k, i in enumerate(free)}
+    sub_packing = sorted([index[i] for i in packing[j]] for j in freed)
+    sub_evaluator = PackingEvaluator(courier, [items[i] for i in free], max_exemptions - kept_exemptions)
+    # Imported here: the API imports this module for cart_after_changes
+    from app.services.milp_optimizer import milp_optimization
+    solution = milp_optimization(courier, [items[i] for i in free],
+                                 max_exemptions=max_exemptions - kept_exemptions,
+                                 initial_packing=(sub_packing, sub_evaluator.exempted(sub_packing)),
+                                 **milp_options)
+    if solution.status not in ("Optimal", "Partial"):
+        return None, solution
+    # Items back to their indexes (equal items are interchangeable)
+    positions = {}
+    for i in reversed(free):
+        positions.setdefault(items[i], []).append(i)
+    repacked = [[positions[item].pop() for item in solution.package_items(k)] for k in range(solution.num_packages)]
+    return kept + repacked, solution
+
+def incremental_optimization(courier, items, previous_packing, discount_rate=0,
+                             max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
+                             print_return_value=False,
+                             solve=True,
+                             **milp_options):
+    # Re-optimization of a cart that changed: the repaired previous packing,
+    # with some of its packages repacked by the MILP unless solve=False
+    start_time = time.time()
+    if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
+        max_exemptions = MAX_EXEMPTIONS_PER_YEAR
+    elif max_exemptions < 0:
+        max_exemptions = 0
+    packing, cost, exempted = repair_packing(courier, items, previous_packing, max_exemptions)
+    if packing is None:
+        return PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status="Infeasible",
+                               time_spent=time.time() - start_time)
+    status = "Heuristic"
+    timings = {}
+    if cost <= cart_lower_bound(courier, items, max_exemptions) + MIN_TOLERANCE:
+        status = "Optimal"
+    elif solve and touched_packages(packing, previous_packing):
+        repacked, milp_solution = repack_freed(courier, items, packing, previous_packing, max_exemptions,
+                                               **milp_options)
+        timings = milp_solution.timings
+        evaluator = PackingEvaluator(courier, items, max_exemptions)
+        if repacked is not None and evaluator.cost(repacked) < cost - MIN_TOLERANCE:
+            packing = sorted([sorted(package) for package in repacked])
+            cost = evaluator.cost(packing)
+            exempted = evaluator.exempted(packing)
+        # Proven optimal when the MILP repacked the whole cart
+        whole_cart = repacked is not None and len(repacked) == milp_solution.num_packages
+        if whole_cart and milp_solution.status == "Optimal" \
+                or cost <= cart_lower_bound(courier, items, max_exemptions) + MIN_TOLERANCE:
+            status = "Optimal"
+    if print_return_value:
+        print(f"\n** Objective function value = {cost:.2f}\n")
+    solution = PackageSolution(courier_id=courier,
+                               courier=couriers[courier]["name"],
+                               status=status,
+                               time_spent=time.time() - start_time)
+    solution.timings = timings
+    for j, package in enumerate(packing):
+        assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in package]
+        solution.add_package(build_package(courier, assigned_items, exempt=j in exempted))
+    return solution
@@ -0,0 +1,174 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+import uuid
+from app.core.config import *
+from app.services.solver_pool import solver_pool, SolverPoolBusy, heuristic_arguments
+from app.services.result_cache import result_cache
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+PROGRESS_METHODS = ("milp", "incremental")  # Optimizations that report progress and can be stopped
+
+class Job:
+    def __init__(self, method, kwargs):
+        self.job_id = uuid.uuid4().hex
+        self.method = method
+        self.kwargs = kwargs
+        self.status = JOB_QUEUED
+        self.incumbent = None   # Best solution known while the job runs
+        self.progress = None    # Latest incumbent cost and bound reported by the solver
+        self.progress_queue = None
+        self.stop_event = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        self.task = None
+        self.future = None
+
+    def set_status(self, status):
+        self.status = status
+        self.updated = time.time()
+
+    def to_json(self):
+        return {"job_id": self.job_id,
+                "status": self.status,
+                "incumbent": self.incumbent,
+                "progress": self.progress,
+                "result": self.result,
+                "error": self.error}
+
+class JobStore:
+    # In-process store of optimization jobs. Each job first gets the packing
+    # heuristic's answer as its incumbent, then the solve requested; jobs wait
+    # for room in the solver pool. While the MILP runs the job follows the
+    # solver's incumbent and bound, and a stopped job finishes with the best
+    # solution found so far. Finished jobs are evicted JOB_TTL seconds after
+    # their last update.
+    def __init__(self, ttl=JOB_TTL, max_active=JOB_MAX_ACTIVE):
+        self.ttl = ttl
+        self.max_active = max_active
+        self.jobs = {}
+        self.manager = None     # Serves the progress queues and stop events shared with the solver processes
+
+    def evict(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.status in JOB_FINISHED and now - job.updated > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def active(self):
+        return sum(1 for job in self.jobs.values() if job.status not in JOB_FINISHED)
+
+    def create(self, method, kwargs):
+        self.evict()
+        if self.active() >= self.max_active:
+            raise SolverPoolBusy(f"{self.max_active} jobs in progress")
+        job = Job(method, kwargs)
+        if method in PROGRESS_METHODS:
+            job.progress_queue, job.stop_event = self.solver_channels()
+        self.jobs[job.job_id] = job
+        job.task = asyncio.create_task(self.run(job))
+        return job
+
+    def get(self, job_id):
+        self.evict()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # A solve already running in a worker process is stopped and its
+        # result discarded
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in JOB_FINISHED:
+            if job.future is not None:
+                job.future.cancel()
+            if job.stop_event is not None:
+                job.stop_event.set()
+            job.task.cancel()
+            job.set_status(JOB_CANCELLED)
+        return job
+
+    def stop(self, job_id):
+        # Ends the search of a job, which finishes with the best solution
+        # found so far (the heuristic's if the MILP has not started)
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in JOB_FINISHED and job.stop_event is not None:
+            job.stop_event.set()
+        return job
+
+    def solver_channels(self):
+        # Progress queue and stop event of a solve in another process
+        if self.manager is None:
+            self.manager = multiprocessing.Manager()
+        return self.manager.Queue(), self.manager.Event()
+
+    async def follow(self, job):
+        # Result of the job's solve, updating its progress meanwhile
+        result = asyncio.wrap_future(job.future)
+        while True:
+            done, _ = await asyncio.wait([result], timeout=SOLVER_POLL_INTERVAL)
+            try:
+                while True:
+                    report = job.progress_queue.get_nowait()
+                    incumbent, bound = report["incumbent"], report["bound"]
+                    gap = (incumbent - bound) / abs(incumbent) if incumbent and bound is not None else None
+                    job.progress = {**report, "gap": gap}
+                    job.updated = time.time()
+            except queue.Empty:
+                pass
+            if done:
+                return result.result()
+
+    def shutdown(self):
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    async def run(self, job):
+        try:
+            job.result = result_cache.get(job.method, job.kwargs)
+            if job.result is not None:
+                job.incumbent = job.result
+                job.set_status(JOB_DONE)
+                return
+            heuristic_kwargs = heuristic_arguments(job.kwargs)
+            job.future = await solver_pool.submit_when_free("heuristic", **heuristic_kwargs)
+            job.set_status(JOB_RUNNING)
+            job.incumbent = await asyncio.wrap_future(job.future)
+            job.updated = time.time()
+            if job.method == "heuristic":
+                job.result = job.incumbent
+                result_cache.put(job.method, job.kwargs, job.result)
+            elif job.method not in PROGRESS_METHODS:
+                job.future = await solver_pool.submit_when_free(job.method, **job.kwargs)
+                job.result = await asyncio.wrap_future(job.future)
+                result_cache.put(job.method, job.kwargs, job.result)
+            elif job.stop_event.is_set():
+                job.result = job.incumbent
+            else:
+                job.future = await solver_pool.submit_when_free(job.method, **job.kwargs,
+                                                                progress=job.progress_queue,
+                                                                stop=job.stop_event)
+                job.result = await self.follow(job)
+                result_cache.put(job.method, job.kwargs, job.result)
+                if job.result["status"] == "Not Solved":    # Stopped before the solver found a solution
+                    job.result = job.incumbent
+            job.set_status(JOB_DONE)
+        except asyncio.CancelledError:
+            job.set_status(JOB_CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            job.set_status(JOB_FAILED)
+
+job_store = JobStore()
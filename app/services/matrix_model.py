@@ -0,0 +1,431 @@
+import os
+import re
+import select
+import signal
+import subprocess
+import tempfile
+import time
+from math import ceil, inf
+import numpy as np
+from app.core.config import *
+from app.utils.courier_services import *
+from app.utils.lazy_imports import LazyModule
+
+pulp = LazyModule("pulp")     # Only for the path of the CBC binary
+
+# MATRIX MODELS
+# =============
+# A minimization model assembled in bulk as arrays instead of PuLP expression
+# objects: columns with bounds, costs and integrality, rows with a sense and a
+# right hand side, and the constraint matrix as (row, column, value) entries.
+# It goes to CBC through an MPS file written from the arrays.
+
+FREIGHT_FACTOR = 1 + TAX_ON_FREIGHT + TFSPU_RATE  # Transport cost of one unit of freight
+
+class MatrixModel:
+    def __init__(self):
+        self.names = []     # Column groups: (name, first column, count), for the debug dump
+        self.lower = []
+        self.upper = []
+        self.cost = []
+        self.integer = []
+        self.sense = []
+        self.rhs = []
+        self.entries = []
+        self.num_columns = 0
+        self.num_rows = 0
+
+    def add_columns(self, name, count, lower=0, upper=inf, integer=False, cost=0):
+        columns = np.arange(self.num_columns, self.num_columns + count)
+        self.names.append((name, self.num_columns, count))
+        self.lower.append(np.broadcast_to(np.asarray(lower, dtype=float), (count,)))
+        self.upper.append(np.broadcast_to(np.asarray(upper, dtype=float), (count,)))
+        self.cost.append(np.broadcast_to(np.asarray(cost, dtype=float), (count,)))
+        self.integer.append(np.full(count, integer))
+        self.num_columns += count
+        return columns
+
+    def add_rows(self, sense, rhs, count):
+        # sense: 'E' (=), 'L' (<=) or 'G' (>=)
+        rows = np.arange(self.num_rows, self.num_rows + count)
+        self.sense.append(np.full(count, sense))
+        self.rhs.append(np.broadcast_to(np.asarray(rhs, dtype=float), (count,)))
+        self.num_rows += count
+        return rows
+
+    def add_entries(self, rows, columns, values):
+        rows, columns, values = np.broadcast_arrays(rows, columns, np.asarray(values, dtype=float))
+        self.entries.append((rows.ravel(), columns.ravel(), values.ravel()))
+
+    def add_blocks(self, name, template, count):
+        # count copies of a TariffTemplate, copy k with its columns and rows
+        # shifted by k times the size of the block. Returns the first column
+        # and the first row of each copy
+        lower, upper, cost, integer, sense, rhs, rows, columns, values = template.arrays
+        first_columns = self.num_columns + template.num_columns * np.arange(count)
+        first_rows = self.num_rows + template.num_rows * np.arange(count)
+        self.names += [(f"{name}{k}_{group}", first_column + start, size)
+                       for k, first_column in enumerate(first_columns.tolist())
+                       for group, start, size in template.names]
+        self.lower.append(np.tile(lower, count))
+        self.upper.append(np.tile(upper, count))
+        self.cost.append(np.tile(cost, count))
+        self.integer.append(np.tile(integer, count))
+        self.sense.append(np.tile(sense, count))
+        self.rhs.append(np.tile(rhs, count))
+        self.entries.append(((first_rows[:, None] + rows).ravel(), (first_columns[:, None] + columns).ravel(),
+                             np.tile(values, count)))
+        self.num_columns += template.num_columns * count
+        self.num_rows += template.num_rows * count
+        return first_columns, first_rows
+
+    def arrays(self):
+        # (lower, upper, cost, integer, sense, rhs, rows, columns, values)
+        rows, columns, values = (np.concatenate(part) for part in zip(*self.entries))
+        return (np.concatenate(self.lower), np.concatenate(self.upper), np.concatenate(self.cost),
+                np.concatenate(self.integer), np.concatenate(self.sense), np.concatenate(self.rhs),
+                rows, columns, values)
+
+    def column_names(self):
+        return [f"{name}_{k}" for name, _, count in self.names for k in range(count)]
+
+def write_mps(model, path, lower=None, upper=None):
+    # Fixed MPS with columns C<k> and rows R<k>; lower and upper replace the
+    # bounds of the model when given
+    model_lower, model_upper, cost, integer, sense, rhs, rows, columns, values = model.arrays()
+    lower = model_lower if lower is None else lower
+    upper = model_upper if upper is None else upper
+    # Objective entries as row -1, every column listed at least once
+    objective = np.flatnonzero(cost != 0)
+    missing = np.setdiff1d(np.arange(model.num_columns), np.concatenate([columns, objective]))
+    objective = np.concatenate([objective, missing])
+    rows = np.concatenate([np.full(len(objective), -1), rows])
+    columns = np.concatenate([objective, columns])
+    values = np.concatenate([cost[objective], values])
+    order = np.lexsort((rows, columns))
+    rows, columns, values = rows[order], columns[order], values[order]
+    lines = ["NAME          MODEL", "ROWS", " N  OBJ"]
+    lines += [f" {s}  R{k}" for k, s in enumerate(sense)]
+    lines.append("COLUMNS")
+    in_integers = False
+    for column, row, value in zip(columns.tolist(), rows.tolist(), values.tolist()):
+        if integer[column] != in_integers:
+            in_integers = not in_integers
+            lines.append(f"    MARK      'MARKER'                 '{'INTORG' if in_integers else 'INTEND'}'")
+        lines.append(f"    C{column:<8} {'OBJ' if row < 0 else f'R{row}':<8}  {value:.12g}")
+    if in_integers:
+        lines.append("    MARK      'MARKER'                 'INTEND'")
+    lines.append("RHS")
+    lines += [f"    RHS       R{k:<8}  {value:.12g}" for k, value in enumerate(rhs.tolist()) if value != 0]
+    lines.append("BOUNDS")
+    for column, (low, high, is_integer) in enumerate(zip(lower.tolist(), upper.tolist(), integer.tolist())):
+        if low == high:
+            lines.append(f" FX BND       C{column:<8}  {low:.12g}")
+            continue
+        if low != 0:
+            lines.append(f" LO BND       C{column:<8}  {low:.12g}")
+        if high != inf:
+            lines.append(f" UP BND       C{column:<8}  {high:.12g}")
+        elif is_integer:
+            lines.append(f" PL BND       C{column:<8}")    # Integer columns are binary by default
+    lines.append("ENDATA")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def read_cbc_solution(path, num_columns):
+    # (status, values) from a CBC solution file: status is "Optimal",
+    # "Feasible" (stopped with a solution), "Infeasible" or "Not Solved"
+    values = np.zeros(num_columns)
+    with open(path) as f:
+        header = f.readline().split()
+        for line in f:
+            fields = line.split()
+            if fields and fields[0] == "**":
+                fields = fields[1:]
+            if len(fields) >= 3 and fields[1].startswith("C"):
+                values[int(fields[1][1:])] = float(fields[2])
+    if not header:
+        return "Not Solved", values
+    if header[0] == "Optimal":
+        return "Optimal", values
+    if header[0] in ("Infeasible", "Integer"):
+        return "Infeasible", values
+    if len(header) >= 5 and header[4] == "objective":
+        return "Feasible", values
+    return "Not Solved", values
+
+# Log lines of CBC with a new incumbent or a new bound of the objective
+CBC_INCUMBENT = re.compile(r"Cbc00(?:04|12|16)I Integer solution of ([-+.\de]+)"
+                           r"|MIPStart provided solution with cost ([-+.\de]+)")
+CBC_BOUND = re.compile(r"best possible ([-+.\de]+)|changed objective from \S+ to ([-+.\de]+)"
+                       r"|Continuous objective value is ([-+.\de]+)")
+
+def run_cbc_with_progress(command, log, on_progress=None, stop=None):
+    # Runs CBC on a pseudo terminal, where it writes its log line by line
+    # instead of in blocks, and calls on_progress(incumbent, bound, elapsed)
+    # whenever either improves. Once the event 'stop' is set CBC gets SIGINT,
+    # which ends the search with the best solution found; CBC stopped before
+    # it handles the signal (or not started) leaves no solution file
+    if stop is not None and stop.is_set():
+        return
+    master, slave = os.openpty()
+    process = subprocess.Popen(command, stdout=slave, stderr=slave, stdin=subprocess.DEVNULL)
+    os.close(slave)
+    start_time = time.perf_counter()
+    incumbent, bound = None, None
+    pending = ""
+    interrupted = False
+    while True:
+        if not interrupted and stop is not None and stop.is_set():
+            process.send_signal(signal.SIGINT)
+            interrupted = True
+        ready, _, _ = select.select([master], [], [], SOLVER_POLL_INTERVAL)
+        if not ready:
+            if process.poll() is not None:
+                break
+            continue
+        try:
+            data = os.read(master, 65536)
+        except OSError:     # EIO once CBC has exited
+            data = b""
+        if not data:
+            break
+        pending += data.decode(errors="replace").replace("\r\n", "\n")
+        *lines, pending = pending.split("\n")
+        log.writelines(line + "\n" for line in lines)
+        improved = False
+        for line in lines:
+            match = CBC_INCUMBENT.search(line)
+            if match and (incumbent is None or float(match.group(match.lastindex)) < incumbent):
+                incumbent = float(match.group(match.lastindex))
+                improved = True
+            match = CBC_BOUND.search(line)
+            if match and (bound is None or float(match.group(match.lastindex)) > bound):
+                bound = float(match.group(match.lastindex))
+                improved = True
+        if improved and on_progress is not None:
+            on_progress(incumbent, bound, time.perf_counter() - start_time)
+    log.write(pending)
+    os.close(master)
+    if process.wait() != 0 and not (interrupted and process.returncode == -signal.SIGINT):
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def solve_with_cbc(model, time_limit, lower=None, upper=None, start=None, log_path=None, mps_path=None,
+                   threads=None, mip_gap=None, mip_gap_abs=None, on_progress=None, stop=None, cuts=True):
+    # Solves the model with the CBC binary shipped with PuLP; start is a full
+    # assignment of the columns to start from, mip_gap and mip_gap_abs the
+    # relative and absolute gaps at which the search stops, on_progress and
+    # stop as in run_cbc_with_progress, and cuts whether CBC generates cutting
+    # planes. Returns (status, values)
+    with tempfile.TemporaryDirectory() as directory:
+        mps_path = mps_path or os.path.join(directory, "model.mps")
+        solution_path = os.path.join(directory, "model.sol")
+        write_mps(model, mps_path, lower, upper)
+        command = [pulp.PULP_CBC_CMD().path, mps_path]
+        if start is not None:
+            start_path = os.path.join(directory, "start.mst")
+            with open(start_path, "w") as f:
+                f.write("Stopped on time - objective value 0\n")
+                f.writelines(f"{k:>7} C{k} {value:>15.12g} {0:>23}\n" for k, value in enumerate(start.tolist()))
+            command += ["-mips", start_path]
+        if threads is not None:
+            command += ["-threads", str(threads)]
+        if mip_gap is not None:
+            command += ["-ratio", str(mip_gap)]
+        if mip_gap_abs is not None:
+            command += ["-allow", str(mip_gap_abs)]
+        if not cuts:
+            command += ["-cuts", "off"]
+        command += ["-sec", str(time_limit), "-timeMode", "elapsed", "-branch",
+                    "-printingOptions", "all", "-solution", solution_path]
+        with open(log_path or os.devnull, "w") as log:
+            if on_progress is None and stop is None:
+                subprocess.run(command, stdout=log, stderr=log, stdin=subprocess.DEVNULL, check=True)
+            else:
+                run_cbc_with_progress(command, log, on_progress, stop)
+        if not os.path.exists(solution_path):
+            return "Not Solved", np.zeros(model.num_columns)
+        return read_cbc_solution(solution_path, model.num_columns)
+
+# TARIFF TEMPLATES
+# ================
+# The tariff model of a package only depends on the tariff, so it is compiled
+# once per courier and formulation into a block: the arrays of a MatrixModel
+# with indexes local to the block, one of its columns being the weight of the
+# package in kg. A model with n packages takes n copies of the block with
+# their indexes shifted (add_blocks) instead of building each one again.
+
+class TariffTemplate:
+    def __init__(self, block, weight):
+        self.names = block.names
+        self.arrays = block.arrays()
+        self.num_columns = block.num_columns
+        self.num_rows = block.num_rows
+        self.weight = weight    # Local column of the package weight
+
+def hull_template(tariff):
+    # Convex hull of the tariff steps (see configure_hull_restrictions)
+    segments = np.array(tariff_segments(tariff), dtype=float).reshape(-1, 4)
+    low, high, base, per_unit = segments.T
+    in_increments = (per_unit != 0) & (tariff.increments > 0)
+    block = MatrixModel()
+    weight = block.add_columns("weight", 1)
+    z = block.add_columns("hull_active", len(segments), upper=1, integer=True,
+                          cost=tariff.handling + FREIGHT_FACTOR * base)
+    u = block.add_columns("hull", len(segments), cost=np.where(in_increments, 0, FREIGHT_FACTOR * per_unit))
+    rows = block.add_rows("G", 0, len(z))
+    block.add_entries(rows, u, 1)
+    block.add_entries(rows, z, -low)
+    rows = block.add_rows("L", 0, len(z))
+    block.add_entries(rows, u, 1)
+    block.add_entries(rows, z, -(high - MIN_TOLERANCE/10))
+    if in_increments.any():
+        charged = np.flatnonzero(in_increments)
+        limit = np.ceil(high[charged] / tariff.increments)
+        n = block.add_columns("hull_increments", len(charged), upper=limit, integer=True,
+                              cost=FREIGHT_FACTOR * per_unit[charged] * tariff.increments)
+        rows = block.add_rows("G", 0, len(n))
+        block.add_entries(rows, n, tariff.increments)
+        block.add_entries(rows, u[charged], -1)
+        block.add_entries(rows, z[charged], unit_rounding_margin(tariff))
+        rows = block.add_rows("L", 0, len(n))
+        block.add_entries(rows, n, 1)
+        block.add_entries(rows, z[charged], -limit)
+    rows = block.add_rows("L", 1, 1)
+    block.add_entries(rows[0], z, 1)
+    rows = block.add_rows("E", 0, 1)
+    block.add_entries(rows[0], u, 1)
+    block.add_entries(rows[0], weight, -tariff.unit_factor)
+    return TariffTemplate(block, weight[0])
+
+def bigm_template(tariff):
+    # Step indicators with Big-M constraints (see configure_restrictions and
+    # tariff_bigm_cost) on the weight in the tariff units, rounded up to the
+    # increments when the tariff has them
+    segments = np.array(tariff_segments(tariff), dtype=float).reshape(-1, 4)
+    low, high, base, per_unit = segments.T
+    num_steps = len(segments)
+    factor = tariff.unit_factor
+    block = MatrixModel()
+    weight = block.add_columns("weight", 1)
+    w = block.add_columns("w", num_steps, cost=FREIGHT_FACTOR * per_unit)
+    lb = block.add_columns("w_lb", num_steps, upper=1, integer=True)
+    ub = block.add_columns("w_ub", num_steps, upper=1, integer=True)
+    active = block.add_columns("w_active", num_steps, upper=1, integer=True,
+                               cost=tariff.handling + FREIGHT_FACTOR * base)
+    rows = block.add_rows("L", 1, 1)
+    block.add_entries(rows[0], active, 1)
+    # w = active * units (or the rounded units)
+    if tariff.increments:
+        margin = unit_rounding_margin(tariff) / tariff.increments
+        ceil_int = block.add_columns("w_ceil_int", num_steps, integer=True)
+        ceil_units = block.add_columns("w_ceil", num_steps)
+        rows = block.add_rows("G", -margin, num_steps)
+        block.add_entries(rows, ceil_int, 1)
+        block.add_entries(rows, weight, -factor / tariff.increments)
+        rows = block.add_rows("L", 1 - MIN_TOLERANCE - margin, num_steps)
+        block.add_entries(rows, ceil_int, 1)
+        block.add_entries(rows, weight, -factor / tariff.increments)
+        rows = block.add_rows("E", 0, num_steps)
+        block.add_entries(rows, ceil_units, 1)
+        block.add_entries(rows, ceil_int, -tariff.increments)
+        rows = block.add_rows("G", -M, num_steps)
+        block.add_entries(rows, w, 1)
+        block.add_entries(rows, ceil_units, -1)
+        block.add_entries(rows, active, -M)
+    else:
+        rows = block.add_rows("G", -M, num_steps)
+        block.add_entries(rows, w, 1)
+        block.add_entries(rows, weight, -factor)
+        block.add_entries(rows, active, -M)
+    # active = lb * ub, with lb set when the units are above the lower limit
+    # of the step (or at it, but for the first step) and ub when below the upper
+    rows = block.add_rows("L", np.where(np.arange(num_steps) == 0, low, low - MIN_TOLERANCE), num_steps)
+    block.add_entries(rows, weight, factor)
+    block.add_entries(rows, lb, -M)
+    rows = block.add_rows("L", -high, num_steps)
+    block.add_entries(rows, weight, -factor)
+    block.add_entries(rows, ub, -M)
+    rows = block.add_rows("L", 0, num_steps)
+    block.add_entries(rows, active, 1)
+    block.add_entries(rows, lb, -1)
+    rows = block.add_rows("L", 0, num_steps)
+    block.add_entries(rows, active, 1)
+    block.add_entries(rows, ub, -1)
+    rows = block.add_rows("G", -1, num_steps)
+    block.add_entries(rows, active, 1)
+    block.add_entries(rows, lb, -1)
+    block.add_entries(rows, ub, -1)
+    return TariffTemplate(block, weight[0])
+
+TEMPLATE_BUILDERS = {"bigm": bigm_template, "hull": hull_template}
+tariff_templates = {}   # (courier, formulation): TariffTemplate, emptied when the tariffs are reloaded
+
+def tariff_template(courier, formulation):
+    key = (courier, formulation)
+    if key not in tariff_templates:
+        tariff_templates[key] = TEMPLATE_BUILDERS[formulation](couriers[courier]["tariff"])
+    return tariff_templates[key]
+
+reload_hooks.append(tariff_templates.clear)
+
+# MILP MODEL
+# ==========
+def milp_matrix_model(courier, items, num_packages, max_exemptions, formulation=DEFAULT_MILP_FORMULATION):
+    # The model of milp_optimization with symmetry breaking, without its
+    # intermediate variables (package price, transport and total cost), which
+    # are expressions of the columns below. Returns the model and the column
+    # indexes of x (with their item and package) and of the exemptions
+    num_items = len(items)
+    price = np.array([item[1] for item in items], dtype=float)
+    weight = np.array([item[2] for item in items], dtype=float)
+    model = MatrixModel()
+    # Item i only goes into packages 0..i
+    item_of, package_of = np.nonzero(np.tri(num_items, num_packages, dtype=bool))
+    x = model.add_columns("x", len(item_of), upper=1, integer=True)
+    used = model.add_columns("package_used", num_packages, upper=1, integer=True)
+    positive = model.add_columns("package_price_is_positive", num_packages, upper=1, integer=True)
+    exempt = model.add_columns("import_fee_exempted", num_packages, upper=1, integer=True)
+    fee = model.add_columns("final_import_fee", num_packages, cost=1)
+    package_price = price[item_of]
+    # Every item in a single package
+    rows = model.add_rows("E", 1, num_items)
+    model.add_entries(rows[item_of], x, 1)
+    # Used packages come first, unused ones carry nothing
+    rows = model.add_rows("L", 0, len(x))
+    model.add_entries(rows, x, 1)
+    model.add_entries(rows, used[package_of], -1)
+    rows = model.add_rows("L", 0, num_packages)
+    model.add_entries(rows, used, 1)
+    model.add_entries(rows[package_of], x, -1)
+    rows = model.add_rows("L", 0, max(num_packages - 1, 0))
+    model.add_entries(rows, used[1:], 1)
+    model.add_entries(rows, used[:-1], -1)
+    rows = model.add_rows("L", 0, num_packages)
+    model.add_entries(rows[package_of], x, package_price)
+    model.add_entries(rows, used, -MAX_PRICE_EXEMPTION)
+    rows = model.add_rows("L", 0, num_packages)
+    model.add_entries(rows[package_of], x, weight[item_of])
+    model.add_entries(rows, used, -MAX_WEIGHT_EXEMPTION)
+    # Import fee: IMPORT_FEE_PERCENT * price and MINIMUM_FEE_PAYMENT, relaxed by the exemption
+    rows = model.add_rows("L", 0, num_packages)
+    model.add_entries(rows[package_of], x, package_price)
+    model.add_entries(rows, positive, -MAX_PRICE_EXEMPTION)
+    rows = model.add_rows("G", 0, num_packages)
+    model.add_entries(rows, fee, 1)
+    model.add_entries(rows[package_of], x, -IMPORT_FEE_PERCENT * package_price)
+    model.add_entries(rows, exempt, IMPORT_FEE_PERCENT * MAX_PRICE_EXEMPTION)
+    rows = model.add_rows("G", 0, num_packages)
+    model.add_entries(rows, fee, 1)
+    model.add_entries(rows, positive, -MINIMUM_FEE_PAYMENT)
+    model.add_entries(rows, exempt, MINIMUM_FEE_PAYMENT)
+    rows = model.add_rows("L", max_exemptions, 1)
+    model.add_entries(rows[0], exempt, 1)
+    # Tariff model of every package, a copy of the template of the courier
+    # tied to the weight of the package
+    template = tariff_template(courier, formulation)
+    first_columns, _ = model.add_blocks("tariff", template, num_packages)
+    rows = model.add_rows("E", 0, num_packages)
+    model.add_entries(rows, first_columns + template.weight, 1)
+    model.add_entries(rows[package_of], x, -weight[item_of])
+    return model, {"x": x, "item_of": item_of, "package_of": package_of, "exempt": exempt}
@@ -1,30 +1,177 @@
+import os
+import numpy as np
 import pulp
 from app.core.config import *
 from app.utils.helpers import *
 from app.models.classes import *
 from app.utils.courier_services import *
+from app.utils.package_costs import build_package
+from app.utils.timing import PhaseTimer
+from app.services.dp_optimizer import first_fit_decreasing
+from app.services.heuristic_optimizer import heuristic_packing
+from app.services.matrix_model import milp_matrix_model
+from app.services.solver_backends import (PULP_BACKENDS, START_BACKENDS, select_backend, solve_matrix_model,
+                                          pulp_solver, pulp_status)
+
+def package_limit(items, max_exemptions):
+    # Packages worth opening: merging two non-exempt packages never raises the
+    # import fee and, with handling charged per package, hardly ever the
+    # transport, so the non-exempt packages of a good solution pairwise exceed
+    # a cap. With s = price/MAX_PRICE_EXEMPTION + weight/MAX_WEIGHT_EXEMPTION
+    # summing to S, at most floor(2S)+1 of them pairwise have s_i + s_j > 1.
+    # The exempt ones come on top.
+    size = sum(item[1] / MAX_PRICE_EXEMPTION + item[2] / MAX_WEIGHT_EXEMPTION for item in items)
+    return max(len(first_fit_decreasing(items)), int(2 * size) + 1) + max_exemptions
+
+def complete_initial_values(prob, fixed_values, time_limit):
+    # CBC only accepts a MIP start that sets every integer variable, including
+    # the ones of the tariff models: solve the model with the given values
+    # fixed, which leaves the values of all variables in place for warmStart
+    names = []
+    for var, value in fixed_values.items():
+        names.append(f"warm_start_{var.name}")
+        prob.addConstraint(var == value, name=names[-1])
+    prob.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit))
+    for name in names:
+        del prob.constraints[name]
+    return prob.status == pulp.LpStatusOptimal
+
+def matrix_milp_optimization(courier, items, num_packages, max_exemptions, formulation, print_return_value,
+                             time_limit, warm_start, initial_packing, debug_dir, timer,
+                             backend, solver_options):
+    # milp_optimization with symmetry breaking, with the model assembled as
+    # arrays from the cached tariff templates and solved by any backend;
+    # solver_options are the keyword arguments of solve_matrix_model for the search
+    model, columns = milp_matrix_model(courier, items, num_packages, max_exemptions, formulation)
+    x, item_of, package_of, exempt = columns["x"], columns["item_of"], columns["package_of"], columns["exempt"]
+    timer.lap("build")
+    start = None
+    if warm_start and backend in START_BACKENDS:
+        if initial_packing is None:
+            packing, _, exempted = heuristic_packing(courier, items, max_exemptions)
+        else:
+            packing, exempted = initial_packing
+        if packing is not None and len(packing) <= num_packages:
+            # As in complete_initial_values, the start is completed by solving
+            # the model with the packing and the exemptions fixed
+            lower, upper = (bounds.copy() for bounds in model.arrays()[:2])
+            package_of_item = {i: j for j, package in enumerate(packing) for i in package}
+            lower[x] = upper[x] = [package_of_item.get(i) == j for i, j in zip(item_of.tolist(), package_of.tolist())]
+            lower[exempt] = upper[exempt] = np.isin(np.arange(num_packages), list(exempted))
+            status, values = solve_matrix_model(model, backend, time_limit, lower, upper,
+                                                threads=solver_options["threads"])
+            if status == "Optimal":
+                start = values
+    timer.lap("warm_start")
+    print("Optimization beginning...")
+    status, values = solve_matrix_model(model, backend, time_limit, start=start,
+                                        log_path=os.path.join(debug_dir, "model_info.log") if debug_dir else None,
+                                        mps_path=os.path.join(debug_dir, "problem_definition.mps") if debug_dir else None,
+                                        **solver_options)
+    solver_time = timer.lap("solve")
+    print("Optimization completed.")
+    status = {"Optimal": "Optimal", "Feasible": "Partial", "Infeasible": "Infeasible"}.get(status, "Not Solved")
+    print(f"\n>> {status} solution has been determined in {solver_time:.2f} seconds <<")
+    if debug_dir:
+        with open(os.path.join(debug_dir, "variable_values.log"), "w") as f:
+            for name, value in zip(model.column_names(), values.tolist()):
+                f.write(f"{name} ==> {value}\n")
+        timer.lap("write_values")
+    if print_return_value and status in ("Optimal", "Partial"):
+        print(f"\n** Objective function value = {model.arrays()[2] @ values:.2f}\n")
+    optimal_solution = PackageSolution(courier_id=courier,
+                                       courier=couriers[courier]["name"],
+                                       status=status,
+                                       time_spent=solver_time)
+    if status in ("Optimal", "Partial"):
+        chosen = values[x] > 0.5
+        for j in range(num_packages):
+            assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in item_of[chosen & (package_of == j)]]
+            if assigned_items:
+                optimal_solution.add_package(build_package(courier, assigned_items, exempt=values[exempt[j]] > 0.5))
+    timer.lap("extract")
+    optimal_solution.timings = timer.phases
+    return optimal_solution
 
 def milp_optimization(courier, items, discount_rate= 0,
                       max_packages=None,
                       max_exemptions=MAX_EXEMPTIONS_PER_YEAR,
                       print_return_value=False,
-                      time_limit=MAX_OPTIM_TIME):
+                      time_limit=MAX_OPTIM_TIME,
+                      formulation=DEFAULT_MILP_FORMULATION,
+                      symmetry_breaking=True,
+                      warm_start=True,
+                      initial_packing=None,
+                      assembly=DEFAULT_MILP_ASSEMBLY,
+                      backend=DEFAULT_SOLVER_BACKEND,
+                      threads=SOLVER_THREADS,
+                      mip_gap=MIP_GAP_REL,
+                      mip_gap_abs=MIP_GAP_ABS,
+                      progress=None,
+                      stop=None,
+                      debug_dir=None):
+    # progress: queue that gets {"incumbent", "bound", "elapsed"} whenever the
+    # solver improves either; stop: event that ends the search with the best
+    # solution found. Both are only taken by CBC on the matrix assembly
+    timer = PhaseTimer()
     num_items = len(items)
-    if max_packages == None:
-        num_packages = num_items
-    elif max_packages > num_items:
+    if num_items == 0:
+        # Nothing to pack, with either assembly or backend
+        empty_solution = PackageSolution(courier_id=courier,
+                                         courier=couriers[courier]["name"],
+                                         status="Optimal")
+        empty_solution.timings = timer.phases
+        return empty_solution
+    if max_packages == None or max_packages > num_items:
         num_packages = num_items
     elif max_packages < 1:
         num_packages = 1
+    else:
+        num_packages = max_packages
     if max_exemptions>MAX_EXEMPTIONS_PER_YEAR:
         max_exemptions = MAX_EXEMPTIONS_PER_YEAR
     elif max_exemptions < 0:
         max_exemptions = 0
+    if formulation not in MILP_FORMULATIONS:
+        formulation = DEFAULT_MILP_FORMULATION
+    if symmetry_breaking:
+        num_packages = min(num_packages, package_limit(items, max_exemptions))
+    if threads is not None:
+        threads = min(max(threads, 1), MAX_SOLVER_THREADS)
+    if mip_gap is not None and mip_gap < 0:
+        mip_gap = None
+    if mip_gap_abs is not None and mip_gap_abs < 0:
+        mip_gap_abs = None
+    # CBC's cutting planes (probing and flow cover cuts in particular) cut off
+    # optimal packings of the hull formulation, which then come back "Optimal"
+    # above the optimum. The hull is tight enough to be solved faster without them
+    cuts = formulation != "hull"
+    if assembly == "matrix" and symmetry_breaking:
+        on_progress = None
+        if progress is not None:
+            def on_progress(incumbent, bound, elapsed):
+                progress.put({"incumbent": incumbent, "bound": bound, "elapsed": elapsed})
+        solver_options = {"threads": threads,
+                          "mip_gap": mip_gap,
+                          "mip_gap_abs": mip_gap_abs,
+                          "on_progress": on_progress,
+                          "stop": stop,
+                          "cuts": cuts}
+        return matrix_milp_optimization(courier, items, num_packages, max_exemptions, formulation, print_return_value,
+                                        time_limit, warm_start, initial_packing, debug_dir, timer,
+                                        select_backend(backend), solver_options)
+    # The in-process backends other than HiGHS only take array models
+    backend = select_backend(backend, PULP_BACKENDS)
     courier_cost = couriers[courier]["cost_function"]
     # Initialize PuLP problem
     prob = pulp.LpProblem("Minimize_Import_Costs", pulp.LpMinimize)
     # Binary variable: whether item i is in package j
-    x = pulp.LpVariable.dicts("x", ((i, j) for i in range(num_items) for j in range(num_packages)), cat='Binary')
+    # (with symmetry breaking, item i only goes into packages 0..i)
+    if symmetry_breaking:
+        x = pulp.LpVariable.dicts("x", ((i, j) for i in range(num_items) for j in range(min(i+1, num_packages))), cat='Binary')
+    else:
+        x = pulp.LpVariable.dicts("x", ((i, j) for i in range(num_items) for j in range(num_packages)), cat='Binary')
+    package_items = [[i for i in range(num_items) if (i, j) in x] for j in range(num_packages)]
     # Weight of each package
     weight = pulp.LpVariable.dicts("weight", range(num_packages), lowBound=0)
     # Price of each package
@@ -46,72 +193,118 @@ def milp_optimization(courier, items, discount_rate= 0,
     # ============
     # All items must be included on a single package
     for i in range(num_items):
-        prob += pulp.lpSum(x[i, j] for j in range(num_packages)) == 1
+        prob += pulp.lpSum(x[i, j] for j in range(num_packages) if (i, j) in x) == 1
+    if symmetry_breaking:
+        # Used packages come first: a package may only hold items if the previous one does
+        package_used = pulp.LpVariable.dicts("package_used", range(num_packages), cat='Binary')
+        for j in range(num_packages):
+            for i in package_items[j]:
+                prob += x[i, j] <= package_used[j]
+            prob += package_used[j] <= pulp.lpSum(x[i, j] for i in package_items[j])
+            if j > 0:
+                prob += package_used[j] <= package_used[j-1]
     # Price, weight, and import fee constraints
     for j in range(num_packages):
         prob += package_price[j] == pulp.lpSum([items[i][1] * x[i, j]
-                                                for i in range(num_items)])
+                                                for i in package_items[j]])
         prob += package_price[j] <= MAX_PRICE_EXEMPTION # Price constraint
-        prob = add_linear_constraints_var_greater_than_value(result=package_price_is_positive[j],
-                                                             var=package_price[j],
-                                                             value=0,
-                                                             prob=prob)
-        prob += weight[j] == pulp.lpSum([items[i][2] * x[i, j] for i in range(num_items)])  # Weight constraint
+        prob += weight[j] == pulp.lpSum([items[i][2] * x[i, j] for i in package_items[j]])  # Weight constraint
         prob += weight[j] <= MAX_WEIGHT_EXEMPTION  # Max weight constraint
-        prob += transport_cost[j] == courier_cost(weight[j], prob)
-        # Import fee calculation
-        prob += nominal_import_fee[j] == IMPORT_FEE_PERCENT * package_price[j]
-        # Import fee is lower-capped at MINIMUM_FEE_PAYMENT
-        prob = add_linear_constraints_max(result=import_fee_cost[j],
-                                          value1=nominal_import_fee[j],
-                                          value2=MINIMUM_FEE_PAYMENT,
-                                          auxiliary_var=y[j],
-                                          prob=prob)
-        prob += final_import_fee[j] >= import_fee_cost[j] \
-            - M * import_fee_exempted[j] - M * (1 - package_price_is_positive[j]) # If package price is zero, import fee is zero
+        if symmetry_breaking:
+            # Unused packages carry nothing
+            prob += package_price[j] <= MAX_PRICE_EXEMPTION * package_used[j]
+            prob += weight[j] <= MAX_WEIGHT_EXEMPTION * package_used[j]
+        if formulation == "hull":
+            # Convex hull of the tariff steps, and the import fee bounded by the
+            # natural caps of the package instead of Big-M:
+            # fee >= IMPORT_FEE_PERCENT * price and fee >= MINIMUM_FEE_PAYMENT,
+            # both relaxed only by the exemption
+            prob += transport_cost[j] == tariff_hull_cost(couriers[courier]["tariff"], weight[j], prob)
+            prob += package_price[j] <= MAX_PRICE_EXEMPTION * package_price_is_positive[j]
+            prob += final_import_fee[j] >= IMPORT_FEE_PERCENT * package_price[j] \
+                - IMPORT_FEE_PERCENT * MAX_PRICE_EXEMPTION * import_fee_exempted[j]
+            prob += final_import_fee[j] >= MINIMUM_FEE_PAYMENT * (package_price_is_positive[j] - import_fee_exempted[j])
+        else:
+            prob = add_linear_constraints_var_greater_than_value(result=package_price_is_positive[j],
+                                                                 var=package_price[j],
+                                                                 value=0,
+                                                                 prob=prob)
+            prob += transport_cost[j] == courier_cost(weight[j], prob)
+            # Import fee calculation
+            prob += nominal_import_fee[j] == IMPORT_FEE_PERCENT * package_price[j]
+            # Import fee is lower-capped at MINIMUM_FEE_PAYMENT
+            prob = add_linear_constraints_max(result=import_fee_cost[j],
+                                              value1=nominal_import_fee[j],
+                                              value2=MINIMUM_FEE_PAYMENT,
+                                              auxiliary_var=y[j],
+                                              prob=prob)
+            prob += final_import_fee[j] >= import_fee_cost[j] \
+                - M * import_fee_exempted[j] - M * (1 - package_price_is_positive[j]) # If package price is zero, import fee is zero
         # Calculate total package cost
         prob += total_package_cost[j] == transport_cost[j] + final_import_fee[j]
     # Limit the number of import fee exemptions
     prob += pulp.lpSum([import_fee_exempted[j] for j in range(num_packages)]) <= max_exemptions
     # Objective function: Minimize the total cost (courier fee + import fee)
     prob += pulp.lpSum([total_package_cost[j] for j in range(num_packages)])
-    prob.writeLP("output\\problem_definition.log")
+    timer.lap("build")
+    # Initial solution for the solver from the packing heuristic (or the
+    # packing given as (packages, exempted package indexes)), with its packages
+    # ordered by first item so that it respects the symmetry breaking
+    if warm_start and backend == "cbc":   # PuLP passes no MIP start to HiGHS
+        if initial_packing is None:
+            packing, _, exempted = heuristic_packing(courier, items, max_exemptions)
+        else:
+            packing, exempted = initial_packing
+        warm_start = packing is not None and len(packing) <= num_packages
+    else:
+        warm_start = False
+    if warm_start:
+        fixed_values = {}
+        for j in range(num_packages):
+            package = packing[j] if j < len(packing) else []
+            for i in package_items[j]:
+                fixed_values[x[i, j]] = 1 if i in package else 0
+            fixed_values[import_fee_exempted[j]] = 1 if j in exempted else 0
+        warm_start = complete_initial_values(prob, fixed_values, time_limit)
+    timer.lap("warm_start")
+    # Debug artifacts only when a directory is given
+    if debug_dir:
+        prob.writeLP(os.path.join(debug_dir, "problem_definition.log"))
+        timer.lap("write_lp")
     # Solve the problem
     print("Optimization beginning...")
-    solver = pulp.PULP_CBC_CMD(logPath="output\\model_info.log",
-                               timeLimit=time_limit)
-    status = prob.solve(solver)
+    solver = pulp_solver(backend, time_limit,
+                         log_path=os.path.join(debug_dir, "model_info.log") if debug_dir else None,
+                         warm_start=warm_start,
+                         threads=threads,
+                         mip_gap=mip_gap,
+                         mip_gap_abs=mip_gap_abs,
+                         cuts=cuts)
+    prob.solve(solver)
     solver_time = prob.solutionTime
+    timer.lap("solve")  # The solver, with the writing of its input and reading of its solution
     print("Optimization completed.")
-    if solver_time<=MAX_OPTIM_TIME-OPTIM_TIME_TOLERANCE:
-        status = "Optimal"
-    else:
-        status = "Partial"
+    status = pulp_status(prob)
     print(f"\n>> {status} solution has been determined in {solver_time:.2f} seconds <<")
-    with open("output\\variable_values.log", "w") as f:
-        for var in prob.variables():
-            f.write(f"{var.name} ==> {var.varValue}\n")
-    if print_return_value:
+    if debug_dir:
+        with open(os.path.join(debug_dir, "variable_values.log"), "w") as f:
+            for var in prob.variables():
+                f.write(f"{var.name} ==> {var.varValue}\n")
+        timer.lap("write_values")
+    if print_return_value and status in ("Optimal", "Partial"):
         print(f"\n** Objective function value = {pulp.value(prob.objective):.2f}\n")
     # Create an object with the optimal solution
     optimal_solution = PackageSolution(courier_id=courier,
                                        courier=couriers[courier]["name"],
                                        status=status,
                                        time_spent=solver_time)
-    for j in range(num_packages):
-        assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in range(num_items) if pulp.value(x[i, j]) == 1]
-        if assigned_items:
-            total_price = sum(item[1] for item in assigned_items)
-            total_weight = sum(item[2] for item in assigned_items)
-            transport_cost = courier_cost(total_weight, total=False)
-            import_fee = pulp.value(final_import_fee[j])
-            import_fee_exemption = bool(pulp.value(import_fee_exempted[j]))
-            # Create a Package object
-            package = Package(items=assigned_items,
-                              total_price=total_price,
-                              total_weight=total_weight,
-                              transport_cost=transport_cost,
-                              import_fee=import_fee,
-                              import_fee_exemption=import_fee_exemption)
-            optimal_solution.add_package(package)
+    if status in ("Optimal", "Partial"):
+        for j in range(num_packages):
+            assigned_items = [(items[i][0], items[i][1], items[i][2]) for i in package_items[j] if pulp.value(x[i, j]) > 0.5]
+            if assigned_items:
+                # Costs from the tariffs, not from the solver's values
+                package = build_package(courier, assigned_items, exempt=pulp.value(import_fee_exempted[j]) > 0.5)
+                optimal_solution.add_package(package)
+    timer.lap("extract")
+    optimal_solution.timings = timer.phases
     return optimal_solution
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from app.core.config import *
+from app.utils.courier_services import tariff_file, reload_hooks
+
+CACHED_STATUSES = ("Optimal", "Heuristic", "Infeasible")   # Results that do not depend on the time limit
+
+def is_cacheable(kwargs):
+    # Debugged and profiled optimizations carry artifacts of their own run
+    return not (kwargs.get("debug_dir") or kwargs.get("profile"))
+
+def canonical_order(items):
+    # Item positions sorted by rounded price and weight: carts with the same
+    # multiset of items share the order whatever their names or item order
+    return sorted(range(len(items)),
+                  key=lambda i: (round(items[i][1], COST_DECIMALS), round(items[i][2], WEIGHT_DECIMALS)))
+
+def cache_key(method, kwargs):
+    items = kwargs["items"]
+    return (method,
+            tariff_file["mtime"],    # Results of earlier tariffs are not returned
+            kwargs["courier"],
+            kwargs.get("formulation"),
+            kwargs.get("mip_gap"),     # A gap makes "Optimal" results approximate
+            kwargs.get("mip_gap_abs"),
+            kwargs["max_exemptions"],
+            round(kwargs["discount_rate"], COST_DECIMALS),
+            tuple((round(items[i][1], COST_DECIMALS), round(items[i][2], WEIGHT_DECIMALS))
+                  for i in canonical_order(items)))
+
+def remap_items(result, items, to_canonical):
+    # Copy of a result whose items are replaced either by their canonical
+    # position (to store it) or by the caller's item at that position
+    order = canonical_order(items)
+    if to_canonical:
+        position = {}
+        for k, i in enumerate(order):
+            position.setdefault((items[i][0], items[i][1], items[i][2]), []).append(k)
+    packages = []
+    for package in result["packages"]:
+        package = dict(package)
+        if to_canonical:
+            package["items"] = [position[(item["name"], item["price"], item["weight"])].pop(0)
+                                for item in package["items"]]
+        else:
+            package["items"] = [{"name": items[order[k]][0], "price": items[order[k]][1], "weight": items[order[k]][2]}
+                                for k in package["items"]]
+        packages.append(package)
+    return {**result, "packages": packages}
+
+class ResultCache:
+    # LRU cache of optimization results with a time to live, keyed on the
+    # canonical cart (see cache_key); stored packages refer to items by
+    # canonical position so that a hit is returned with the caller's names
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, method, kwargs):
+        if not is_cacheable(kwargs):
+            return None
+        key = cache_key(method, kwargs)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return remap_items(entry[1], kwargs["items"], to_canonical=False)
+
+    def put(self, method, kwargs, result):
+        if self.max_entries <= 0 or result is None or result["status"] not in CACHED_STATUSES \
+                or not is_cacheable(kwargs):
+            return
+        key = cache_key(method, kwargs)
+        stored = remap_items(result, kwargs["items"], to_canonical=True)
+        with self.lock:
+            self.entries[key] = (time.time(), stored)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "max_entries": self.max_entries,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0}
+
+result_cache = ResultCache()
+reload_hooks.append(result_cache.clear)
@@ -0,0 +1,157 @@
+import importlib.util
+from math import inf
+import numpy as np
+from app.core.config import *
+from app.services.matrix_model import solve_with_cbc
+from app.utils.lazy_imports import LazyModule
+
+pulp = LazyModule("pulp")     # Listing the backends does not load PuLP
+
+# SOLVER BACKENDS
+# ===============
+# The MILP solvers that can solve an optimization: the CBC binary shipped with
+# PuLP, which takes its model through a file in a process of its own, or
+# HiGHS (highspy) and SciPy's milp (HiGHS as well), which take the arrays of a
+# MatrixModel in process and so skip the model file and the process start,
+# the bulk of the time spent on small carts. highspy and scipy are optional:
+# asking for a backend whose package is missing is an error, as for an
+# unknown one. The in-process solves stop at a zero gap unless one is given,
+# as CBC does, instead of at the HiGHS default of 0.01%.
+# "Optimal" is the optimum of the model, which prices the packages before
+# their costs are rounded to cents: the rounded total of an optimal answer,
+# from any backend, can be a few cents above that of the best rounded
+# packing (up to about 2 cents per package).
+
+BACKEND_PACKAGES = {"cbc": "pulp", "highs": "highspy", "scipy": "scipy"}
+START_BACKENDS = ("cbc", "highs")   # Backends that take a MIP start
+PULP_BACKENDS = ("cbc", "highs")    # Backends of models built with PuLP
+
+def backend_available(backend):
+    package = BACKEND_PACKAGES.get(backend)
+    return package is not None and importlib.util.find_spec(package) is not None
+
+def available_backends():
+    return [backend for backend in SOLVER_BACKENDS if backend_available(backend)]
+
+def select_backend(backend, supported=SOLVER_BACKENDS):
+    # The backend if it is supported, else the default (and CBC when the
+    # default is not). Raises ValueError if it is unknown or not installed
+    if not backend_available(backend):
+        raise ValueError(f"Solver backend '{backend}' is not available, choose one of {available_backends()}")
+    for candidate in (backend, DEFAULT_SOLVER_BACKEND):
+        if candidate in supported and backend_available(candidate):
+            return candidate
+    return "cbc"
+
+def row_bounds(sense, rhs):
+    # Lower and upper bounds of the rows from their sense and right hand side
+    row_lower = np.where(sense == "L", -inf, rhs)
+    row_upper = np.where(sense == "G", inf, rhs)
+    return row_lower, row_upper
+
+def solve_with_highs(model, time_limit, lower=None, upper=None, start=None, log_path=None,
+                     threads=None, mip_gap=None, mip_gap_abs=None):
+    # Solves the model in process with highspy. HiGHS sizes its thread pool on
+    # the first solve of the process, so 'threads' only counts then
+    import highspy
+    model_lower, model_upper, cost, integer, sense, rhs, rows, columns, values = model.arrays()
+    lp = highspy.HighsLp()
+    lp.num_col_ = model.num_columns
+    lp.num_row_ = model.num_rows
+    lp.col_cost_ = cost
+    lp.col_lower_ = model_lower if lower is None else lower
+    lp.col_upper_ = model_upper if upper is None else upper
+    lp.row_lower_, lp.row_upper_ = row_bounds(sense, rhs)
+    # Constraint matrix by columns
+    order = np.lexsort((rows, columns))
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = np.concatenate([[0], np.cumsum(np.bincount(columns, minlength=model.num_columns))])
+    lp.a_matrix_.index_ = rows[order]
+    lp.a_matrix_.value_ = values[order]
+    lp.integrality_ = [highspy.HighsVarType.kInteger if is_integer else highspy.HighsVarType.kContinuous
+                       for is_integer in integer.tolist()]
+    highs = highspy.Highs()
+    highs.setOptionValue("output_flag", log_path is not None)
+    if log_path is not None:
+        highs.setOptionValue("log_to_console", False)
+        highs.setOptionValue("log_file", log_path)
+    highs.setOptionValue("time_limit", float(time_limit))
+    if threads is not None:
+        highs.setOptionValue("threads", int(threads))
+    highs.setOptionValue("mip_rel_gap", float(mip_gap or 0))
+    if mip_gap_abs is not None:
+        highs.setOptionValue("mip_abs_gap", float(mip_gap_abs))
+    highs.passModel(lp)
+    if start is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = start.tolist()
+        highs.setSolution(solution)
+    highs.run()
+    model_status = highs.getModelStatus()
+    solution = highs.getSolution()
+    values = np.array(solution.col_value) if solution.value_valid else np.zeros(model.num_columns)
+    if model_status == highspy.HighsModelStatus.kOptimal:
+        return "Optimal", values
+    if model_status == highspy.HighsModelStatus.kInfeasible:
+        return "Infeasible", values
+    return ("Feasible" if solution.value_valid else "Not Solved"), values
+
+def solve_with_scipy(model, time_limit, lower=None, upper=None, log_path=None, mip_gap=None):
+    # Solves the model in process with scipy.optimize.milp, which takes
+    # neither a MIP start, a thread count nor an absolute gap
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from scipy.sparse import csc_array
+    model_lower, model_upper, cost, integer, sense, rhs, rows, columns, values = model.arrays()
+    matrix = csc_array((values, (rows, columns)), shape=(model.num_rows, model.num_columns))
+    options = {"time_limit": float(time_limit), "mip_rel_gap": float(mip_gap or 0)}
+    result = milp(cost,
+                  integrality=integer.astype(int),
+                  bounds=Bounds(model_lower if lower is None else lower, model_upper if upper is None else upper),
+                  constraints=LinearConstraint(matrix, *row_bounds(sense, rhs)),
+                  options=options)
+    if log_path is not None:
+        with open(log_path, "w") as f:
+            f.write(f"{result.message}\n")
+    values = result.x if result.x is not None else np.zeros(model.num_columns)
+    if result.status == 0:
+        return "Optimal", values
+    if result.status == 2:
+        return "Infeasible", values
+    return ("Feasible" if result.x is not None else "Not Solved"), values
+
+def solve_matrix_model(model, backend, time_limit, lower=None, upper=None, start=None,
+                       log_path=None, mps_path=None, threads=None, mip_gap=None, mip_gap_abs=None,
+                       on_progress=None, stop=None, cuts=True):
+    # (status, values) of a MatrixModel with the given backend; status is
+    # "Optimal", "Feasible" (stopped with a solution), "Infeasible" or
+    # "Not Solved". The MPS file, the progress reports, the stop event and
+    # cuts are only taken by CBC
+    if backend == "highs":
+        return solve_with_highs(model, time_limit, lower, upper, start, log_path, threads, mip_gap, mip_gap_abs)
+    if backend == "scipy":
+        return solve_with_scipy(model, time_limit, lower, upper, log_path, mip_gap)
+    return solve_with_cbc(model, time_limit, lower, upper, start, log_path, mps_path,
+                          threads, mip_gap, mip_gap_abs, on_progress, stop, cuts)
+
+def pulp_solver(backend, time_limit, log_path=None, warm_start=False, threads=None, mip_gap=None, mip_gap_abs=None,
+                cuts=True):
+    # PuLP solver object of a backend for the models built with PuLP. HiGHS
+    # writes its log to the standard output unless output_flag is off
+    if backend == "highs":
+        log_options = {"log_to_console": False, "log_file": log_path} if log_path else {}
+        return pulp.HiGHS(msg=False, timeLimit=time_limit, threads=threads, gapRel=mip_gap or 0, gapAbs=mip_gap_abs,
+                          output_flag=log_path is not None, **log_options)
+    return pulp.PULP_CBC_CMD(msg=False, logPath=log_path, timeLimit=time_limit, warmStart=warm_start,
+                             threads=threads, gapRel=mip_gap, gapAbs=mip_gap_abs,
+                             options=[] if cuts else ["cuts off"])
+
+def pulp_status(prob):
+    # Status of a solved PuLP problem from the solver's answer: "Optimal",
+    # "Partial" (stopped with a solution), "Infeasible" or "Not Solved"
+    if prob.sol_status == pulp.LpSolutionOptimal:
+        return "Optimal"
+    if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+        return "Partial"
+    if prob.status == pulp.LpStatusInfeasible:
+        return "Infeasible"
+    return "Not Solved"
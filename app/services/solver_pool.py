@@ -0,0 +1,102 @@
+import asyncio
+import cProfile
+import contextlib
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import *
+from app.utils.timing import profile_report
+
+class SolverPoolBusy(Exception):
+    pass
+
+def run_optimization(method, kwargs):
+    # Runs in a worker process: imports the optimizer there and returns the
+    # solution as the plain dict of PackageSolution.to_json, with the time of
+    # the whole optimization and the cProfile report when 'profile' is set.
+    # The optimizers' progress messages go to stderr, so that stdout can
+    # carry results. The tariffs are reloaded first if their file changed
+    from app.utils.courier_services import refresh_tariffs
+    refresh_tariffs(interval=0)
+    profiler = cProfile.Profile() if kwargs.pop("profile", False) else None
+    if method == "heuristic":
+        from app.services.heuristic_optimizer import heuristic_optimization as optimization
+    elif method == "incremental":
+        from app.services.incremental_optimizer import incremental_optimization as optimization
+    elif method == "decomposition":
+        from app.services.decomposition_optimizer import decomposition_optimization as optimization
+    else:
+        from app.services.milp_optimizer import milp_optimization as optimization
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        if profiler is not None:
+            profiler.enable()
+        solution = optimization(**kwargs)
+        if profiler is not None:
+            profiler.disable()
+    solution.timings["optimization"] = time.perf_counter() - start_time
+    result = solution.to_json()
+    if profiler is not None:
+        result["profile"] = profile_report(profiler)
+    return result
+
+def heuristic_arguments(kwargs):
+    # Arguments of an optimization that the packing heuristic also takes
+    return {key: value for key, value in kwargs.items()
+            if key in ("courier", "items", "discount_rate", "max_exemptions")}
+
+class SolverPool:
+    # Bounded pool of solver processes. At most 'workers' solves run at once
+    # and 'max_queue' more may wait; beyond that submit() raises SolverPoolBusy
+    # so that the API can answer right away instead of piling up requests.
+    def __init__(self, workers=SOLVER_WORKERS, max_queue=SOLVER_MAX_QUEUE):
+        self.workers = max(workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self.executor = None
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, method, **kwargs):
+        with self.lock:
+            if self.pending >= self.workers + self.max_queue:
+                raise SolverPoolBusy(f"{self.pending} optimizations pending")
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.pending += 1
+        try:
+            future = self.executor.submit(run_optimization, method, kwargs)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    async def submit_when_free(self, method, **kwargs):
+        # Waits for room in the pool instead of failing
+        while True:
+            try:
+                return self.submit(method, **kwargs)
+            except SolverPoolBusy:
+                await asyncio.sleep(SOLVER_POLL_INTERVAL)
+
+    async def run(self, method, **kwargs):
+        return await asyncio.wrap_future(self.submit(method, **kwargs))
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+
+    def status(self):
+        with self.lock:
+            return {"workers": self.workers,
+                    "max_queue": self.max_queue,
+                    "pending": self.pending}
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+solver_pool = SolverPool()
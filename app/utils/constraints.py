@@ -1,7 +1,13 @@
+from math import ceil
 from app.core.config import *
-import pulp
+from app.utils.lazy_imports import LazyModule
 
-def configure_restrictions(weight_steps, total_weight, prob, ceil=None):
+pulp = LazyModule("pulp")
+
+def configure_restrictions(weight_steps, total_weight, prob, ceil=None, name=None, ceil_margin=0):
+    # 'name' labels the variables (total_weight by default, which may be an expression);
+    # with ceil, the weight rounded up is that of total_weight - ceil_margin
+    name = total_weight if name is None else name
     rates = [step[2] for step in weight_steps]
     lowbounds = [step[0] for step in weight_steps]
     upbounds = [step[1] for step in weight_steps]
@@ -14,26 +20,26 @@ def configure_restrictions(weight_steps, total_weight, prob, ceil=None):
     if ceil:
         w_ceil_vars = []
     for i in range(num_steps):
-        w_var = pulp.LpVariable(f'w{i+1}_{total_weight}', lowBound=0)
+        w_var = pulp.LpVariable(f'w{i+1}_{name}', lowBound=0)
         w_lb_var = pulp.LpVariable(
-            f'w{i+1}_{total_weight}_lb', cat='Binary')
+            f'w{i+1}_{name}_lb', cat='Binary')
         w_ub_var = pulp.LpVariable(
-            f'w{i+1}_{total_weight}_ub', cat='Binary')
+            f'w{i+1}_{name}_ub', cat='Binary')
         w_active_var = pulp.LpVariable(
-            f'w{i+1}_{total_weight}_active', cat='Binary')
+            f'w{i+1}_{name}_active', cat='Binary')
         w_vars.append(w_var)
         w_lb_vars.append(w_lb_var)
         w_ub_vars.append(w_ub_var)
         w_active_vars.append(w_active_var)
         if ceil:
-            w_ceil_int_var = pulp.LpVariable(f'w{i+1}_{total_weight}_ceil_int', lowBound=0, cat='Integer')
-            w_ceil_var = pulp.LpVariable(f'w{i+1}_{total_weight}_ceil', lowBound=0)
+            w_ceil_int_var = pulp.LpVariable(f'w{i+1}_{name}_ceil_int', lowBound=0, cat='Integer')
+            w_ceil_var = pulp.LpVariable(f'w{i+1}_{name}_ceil', lowBound=0)
             w_ceil_int_vars.append(w_ceil_int_var)
             w_ceil_vars.append(w_ceil_var)
     prob += pulp.lpSum(w_active_vars) <= 1
     for i in range(num_steps):
         if ceil:
-            prob = add_linear_constraints_ceil(result=w_ceil_vars[i], var=total_weight,
+            prob = add_linear_constraints_ceil(result=w_ceil_vars[i], var=total_weight - ceil_margin,
                                                int_var=w_ceil_int_vars[i], prob=prob, precision=ceil)
             prob = add_linear_constraints_prod_bin_cont(result=w_vars[i], bin_var=w_active_vars[i],
                                                         cont_var=w_ceil_vars[i], prob=prob)
@@ -47,6 +53,35 @@ def configure_restrictions(weight_steps, total_weight, prob, ceil=None):
                                                         avoid_low_limit=True if i == 0 else False)
     return prob, rates, w_active_vars, w_vars
 
+def configure_hull_restrictions(segments, total_weight, prob, increments=0, unit_factor=1, margin=0):
+    # Multiple-choice (convex hull) model of a piecewise tariff, no Big-M:
+    # segments are disjoint (low, high, base, per_unit) intervals in the tariff
+    # units, z_i selects the segment holding the weight and u_i carries it.
+    # With increments, the chargeable units are an integer number of
+    # increments covering u_i less the margin (the cost being minimized keeps
+    # it at the ceiling)
+    z_vars = []
+    u_vars = []
+    charged_vars = []
+    for i, (low, high, base, per_unit) in enumerate(segments):
+        z_var = pulp.LpVariable(f'hull{i+1}_{total_weight}_active', cat='Binary')
+        u_var = pulp.LpVariable(f'hull{i+1}_{total_weight}', lowBound=0)
+        prob += u_var >= low * z_var
+        prob += u_var <= (high - MIN_TOLERANCE/10) * z_var
+        if per_unit and increments:
+            n_var = pulp.LpVariable(f'hull{i+1}_{total_weight}_increments', lowBound=0,
+                                    upBound=ceil(high / increments), cat='Integer')
+            prob += n_var * increments >= u_var - margin * z_var
+            prob += n_var <= ceil(high / increments) * z_var
+            charged_vars.append(increments * n_var)
+        else:
+            charged_vars.append(u_var)
+        z_vars.append(z_var)
+        u_vars.append(u_var)
+    prob += pulp.lpSum(z_vars) <= 1
+    prob += pulp.lpSum(u_vars) == unit_factor * total_weight
+    return prob, z_vars, charged_vars
+
 def add_linear_constraints_var_within_limits(result, var, var_low, var_high,
                                              limit_low, limit_high, prob,
                                              avoid_low_limit=False):
@@ -1,42 +1,73 @@
+import os
+import sys
+import time
 from app.utils.courier_costs import *
+from app.utils.tariff_tables import TariffSet
+from app.utils.tariff_registry import read_couriers
 
-couriers = {
-    "UBX": {"name": "Urubox",
-            "cost_function": package_cost_urubox,
-            "applies_taxes": False},
-    "MBX": {"name": "Miami-Box",
-            "cost_function": package_cost_miami_box,
-            "applies_taxes": False},
-    "ABX": {"name": "Aerobox",
-            "cost_function": package_cost_aerobox,
-            "applies_taxes": False},
-    "GPR": {"name": "Gripper",
-            "cost_function": package_cost_gripper,
-            "applies_taxes": False},
-    "PMO": {"name": "Punto Mío",
-            "cost_function": package_cost_punto_mio,
-            "applies_taxes": False},
-    "UYC": {"name": "Uruguay Cargo",
-            "cost_function": package_cost_uruguay_cargo,
-            "applies_taxes": False},
-    "USX": {"name": "USX",
-            "cost_function": package_cost_usx,
-            "applies_taxes": True},
-    "XUR": {"name": "Exur",
-            "cost_function": package_cost_exur,
-            "applies_taxes": False},
-    "GBX": {"name": "Grinbox",
-            "cost_function": package_cost_grinbox,
-            "applies_taxes": False},
-    "MLT": {"name": "MeLoTRAIGO",
-            "cost_function": package_cost_melotraigo,
-            "applies_taxes": False},
-    "BBX": {"name": "Buybox",
-            "cost_function": package_cost_buybox,
-            "applies_taxes": False}
-    }
-courier_list = [{"id": courier_id,
-                 "name": data["name"]} for courier_id, data in couriers.items()]
+# The registry is loaded from TARIFF_FILE and reloaded, in place, when the
+# file changes (see refresh_tariffs): modules that imported these names see
+# the new tariffs. Functions in reload_hooks are called after every reload,
+# to drop what was computed with the previous tariffs.
+couriers = {}
+courier_list = []
+courier_ids = []
+courier_tariffs = None
+single_courier_tariffs = {}
+reload_hooks = []
+tariff_file = {"path": TARIFF_FILE, "mtime": None, "checked": 0}
+
+def load_tariffs(path=TARIFF_FILE):
+    global courier_tariffs
+    mtime = os.stat(path).st_mtime
+    entries = read_couriers(path)
+    couriers.clear()
+    couriers.update(entries)
+    courier_list[:] = [{"id": courier_id,
+                        "name": data["name"]} for courier_id, data in couriers.items()]
+    courier_ids[:] = list(couriers)
+    courier_tariffs = TariffSet([couriers[courier]["tariff"] for courier in courier_ids])
+    single_courier_tariffs.clear()
+    single_courier_tariffs.update({courier: TariffSet([couriers[courier]["tariff"]]) for courier in courier_ids})
+    tariff_file.update(path=path, mtime=mtime, checked=time.time())
+    for hook in reload_hooks:
+        hook()
+
+def refresh_tariffs(interval=TARIFF_CHECK_INTERVAL):
+    # Reloads the tariffs if their file changed, checking it at most every
+    # 'interval' seconds. A file that is not valid is reported and the
+    # tariffs in use are kept
+    now = time.time()
+    if now - tariff_file["checked"] < interval:
+        return False
+    tariff_file["checked"] = now
+    try:
+        mtime = os.stat(tariff_file["path"]).st_mtime
+        if mtime == tariff_file["mtime"]:
+            return False
+        load_tariffs(tariff_file["path"])
+    except OSError as e:
+        print(f"Tariffs not reloaded: {e}", file=sys.stderr)
+        return False
+    except ValueError as e:
+        tariff_file["mtime"] = mtime    # Reported once, until the file changes again
+        print(f"Tariffs not reloaded: {e}", file=sys.stderr)
+        return False
+    return True
+
+load_tariffs()
+
+def batch_cost(courier, weights, total=True):
+    # Transport cost of an array of weights for one courier
+    costs = single_courier_tariffs[courier].transport_costs(weights, total=total)
+    if total:
+        return costs[0]
+    return {key: value[0] for key, value in costs.items()}
+
+def batch_cost_all(weights, total=True):
+    # Transport cost of an array of weights for every courier, one row per
+    # courier in the order of courier_ids
+    return courier_tariffs.transport_costs(weights, total=total)
 
 def courier_exists(courier):
     if courier in couriers:
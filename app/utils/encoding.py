@@ -0,0 +1,18 @@
+import json
+try:
+    import orjson
+except ImportError:     # Optional: the standard library's encoder is used instead
+    orjson = None
+
+# RESPONSE ENCODING
+# =================
+# Results are plain dicts of numbers, strings and lists, already in the shape
+# of the response schemas, so the API encodes them straight to bytes instead
+# of validating them against the schemas again. orjson is used when it is
+# installed, several times faster than json on large results.
+
+def encode_json(data):
+    # JSON bytes of a result
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":")).encode()
@@ -1,7 +1,11 @@
 from app.core.config import *
 from app.models.schemas import OptimizationRequest
 import json
-from app.utils.courier_services import courier_exists
+import os
+import time
+import uuid
+from app.utils.courier_services import courier_exists, refresh_tariffs
+from app.services.solver_backends import backend_available
 
 def read_json_input(json_input):
     if isinstance(json_input, OptimizationRequest):
@@ -22,6 +26,91 @@ def read_json_input(json_input):
         fee_exemptions = MAX_EXEMPTIONS_PER_YEAR
     return key, purchased_items, selected_courier, fee_exemptions, discount_rate
 
+def read_solver_options(json_input):
+    # Optional settings of the optimizer; missing or unknown values fall back
+    # to the defaults, but for a backend that is unknown or not installed,
+    # which is None (and the request is not valid)
+    if isinstance(json_input, OptimizationRequest):
+        formulation = json_input.formulation
+        backend = json_input.backend
+        threads = json_input.threads
+        mip_gap = json_input.mip_gap
+        mip_gap_abs = json_input.mip_gap_abs
+        fast = json_input.fast
+        decomposition = json_input.decomposition
+        debug = json_input.debug
+        profile = json_input.profile
+    elif isinstance(json_input, dict):
+        formulation = json_input.get("formulation", DEFAULT_MILP_FORMULATION)
+        backend = json_input.get("backend", DEFAULT_SOLVER_BACKEND)
+        threads = json_input.get("threads", SOLVER_THREADS)
+        mip_gap = json_input.get("mip_gap", MIP_GAP_REL)
+        mip_gap_abs = json_input.get("mip_gap_abs", MIP_GAP_ABS)
+        fast = json_input.get("fast", False)
+        decomposition = json_input.get("decomposition", False)
+        debug = json_input.get("debug", False)
+        profile = json_input.get("profile", False)
+    if formulation not in MILP_FORMULATIONS:
+        formulation = DEFAULT_MILP_FORMULATION
+    if not backend_available(backend):
+        backend = None
+    if threads is not None:
+        threads = min(max(int(threads), 1), MAX_SOLVER_THREADS)
+    if mip_gap is not None and mip_gap < 0:
+        mip_gap = None
+    if mip_gap_abs is not None and mip_gap_abs < 0:
+        mip_gap_abs = None
+    return {"formulation": formulation,
+            "backend": backend,
+            "threads": threads,
+            "mip_gap": mip_gap,
+            "mip_gap_abs": mip_gap_abs,
+            "fast": bool(fast),
+            "decomposition": bool(decomposition),
+            "debug": bool(debug),
+            "profile": bool(profile)}
+
+def prepare_optimization(json_input):
+    # Optimizer and arguments for a request, None if the inputs are not valid
+    refresh_tariffs()
+    key, purchased_items, selected_courier, fee_exemptions, discount_rate = read_json_input(json_input)
+    if not input_is_valid(key=key,
+                          items=purchased_items,
+                          courier=selected_courier,
+                          fee_exemptions=fee_exemptions,
+                          discount_rate=discount_rate):
+        return None
+    solver_options = read_solver_options(json_input)
+    if solver_options["backend"] is None:
+        return None
+    kwargs = {"courier": selected_courier,
+              "items": purchased_items,
+              "discount_rate": discount_rate,
+              "max_exemptions": fee_exemptions,
+              "print_return_value": False}
+    if solver_options["fast"]:
+        method = "heuristic"
+    elif solver_options["decomposition"]:
+        method = "decomposition"
+    else:
+        method = "milp"
+        kwargs["formulation"] = solver_options["formulation"]
+        kwargs["backend"] = solver_options["backend"]
+        kwargs["threads"] = solver_options["threads"]
+        kwargs["mip_gap"] = solver_options["mip_gap"]
+        kwargs["mip_gap_abs"] = solver_options["mip_gap_abs"]
+        kwargs["debug_dir"] = new_debug_dir(selected_courier) if solver_options["debug"] else None
+    if solver_options["profile"]:
+        kwargs["profile"] = True
+    return method, kwargs
+
+def new_debug_dir(label="optimization"):
+    # Directory of its own under DEBUG_OUTPUT_DIR for the debug artifacts of a
+    # single optimization, so that concurrent requests never share files
+    path = os.path.join(DEBUG_OUTPUT_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{uuid.uuid4().hex[:8]}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
 def json_pretty(json_input):
     return json.dumps(json_input, indent=4)
 
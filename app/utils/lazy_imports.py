@@ -0,0 +1,13 @@
+import importlib
+
+class LazyModule:
+    # Stands for a module that is only imported on the first access to one of
+    # its attributes, so that importing the code that uses it stays cheap
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
@@ -0,0 +1,68 @@
+from functools import lru_cache
+from app.core.config import *
+from app.models.classes import *
+from app.utils.courier_services import couriers, reload_hooks
+
+# PACKAGE COST ORACLE
+# ===================
+# The cost of a single package only depends on the courier, its weight and
+# price (rounded to WEIGHT_DECIMALS and COST_DECIMALS) and whether its import
+# fee is exempted, so it is computed once per key in each process and shared
+# by the optimizers and the result builders. The TransportCost objects
+# returned, immutable, are shared by every caller.
+
+def import_fee_of(price):
+    return max(IMPORT_FEE_PERCENT * price, MINIMUM_FEE_PAYMENT) if price > 0 else 0
+
+@lru_cache(maxsize=PACKAGE_COST_CACHE_SIZE)
+def cached_transport_cost(courier, weight):
+    # An empty package (weight 0) is not shipped
+    if weight <= 0:
+        return TransportCost.zero()
+    return couriers[courier]["cost_function"](weight, total=False)
+
+@lru_cache(maxsize=PACKAGE_COST_CACHE_SIZE)
+def cached_package_cost(courier, weight, price, exempt):
+    transport_cost = cached_transport_cost(courier, weight)
+    import_fee = 0 if exempt else import_fee_of(price)
+    return transport_cost, import_fee, transport_cost.total + import_fee
+
+def transport_cost(courier, weight):
+    return cached_transport_cost(courier, round(weight, WEIGHT_DECIMALS))
+
+def transport_total(courier, weight):
+    return cached_transport_cost(courier, round(weight, WEIGHT_DECIMALS)).total
+
+def package_cost(courier, weight, price, exempt=False):
+    # (transport cost, import fee, total cost) of a package
+    return cached_package_cost(courier, round(weight, WEIGHT_DECIMALS), round(price, COST_DECIMALS), bool(exempt))
+
+def build_package(courier, items, exempt=False):
+    # Package of the solutions from its items (name, price, weight)
+    total_price = sum(item[1] for item in items)
+    total_weight = sum(item[2] for item in items)
+    transport, import_fee, _ = package_cost(courier, total_weight, total_price, exempt)
+    return Package(items=items,
+                   total_price=total_price,
+                   total_weight=total_weight,
+                   transport_cost=transport,
+                   import_fee=import_fee,
+                   import_fee_exemption=bool(exempt))
+
+def package_cost_stats():
+    stats = {}
+    for name, function in (("transport", cached_transport_cost), ("package", cached_package_cost)):
+        info = function.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {"entries": info.currsize,
+                       "max_entries": info.maxsize,
+                       "hits": info.hits,
+                       "misses": info.misses,
+                       "hit_rate": info.hits / lookups if lookups else 0}
+    return stats
+
+def clear_package_costs():
+    cached_transport_cost.cache_clear()
+    cached_package_cost.cache_clear()
+
+reload_hooks.append(clear_package_costs)
@@ -0,0 +1,103 @@
+import json
+from functools import partial
+from math import inf
+from app.core.config import *
+from app.utils.tariff_tables import TariffTable
+from app.utils.courier_costs import tariff_cost
+
+# TARIFF REGISTRY
+# ===============
+# The couriers and their tariffs are described in TARIFF_FILE (JSON), one
+# entry per courier id:
+#   "UBX": {"name": "Urubox",
+#           "applies_taxes": false,
+#           "handling": 5,                  USD per package
+#           "vat_on_handling": false,       whether VAT_RATE is added to the handling
+#           "unit": "kg",                   "kg" or "lb", the unit of the steps
+#           "unit_decimals": null,          decimals the weight is rounded to in that unit
+#           "increments": 0,                chargeable weight rounded up to these increments
+#           "surcharge": 0,                 USD added above 'surcharge_above' kg
+#           "surcharge_above": null,
+#           "steps": [[min, max, rate, "f" (fixed) or "l" (per unit), fixed part], ...],
+#           "book_cd": {"handling", "rate", "increments", "minimum", "round"}}
+# Only "name" and "steps" are required; a null max is unbounded. Each entry is
+# compiled into a TariffTable, from which both the numeric costs and the
+# MILP models of the tariff are built (see courier_costs).
+
+UNIT_FACTORS = {"kg": 1, "lb": LBS_PER_KG}
+STEP_TYPES = ("f", "l")
+BOOK_CD_FIELDS = ("handling", "rate", "increments", "minimum")
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def check_fields(courier, definition, fields, check, expected):
+    # ValueError when one of the fields present in definition fails check
+    for field in fields:
+        if field in definition and not check(definition[field]):
+            raise ValueError(f"Courier '{courier}': '{field}' must be {expected}, not {definition[field]!r}")
+
+def compile_tariff(courier, definition):
+    # The TariffTable of a courier entry of the tariff file; ValueError when
+    # the entry is not valid
+    if not isinstance(definition, dict):
+        raise ValueError(f"Courier '{courier}': the entry must be an object, not {definition!r}")
+    steps = definition.get("steps")
+    if not steps or not isinstance(steps, list):
+        raise ValueError(f"Courier '{courier}': no tariff steps")
+    weight_steps = []
+    for step in steps:
+        if not isinstance(step, list) or len(step) not in (4, 5) or step[3] not in STEP_TYPES \
+                or not all(is_number(value) for value in (step[0], step[2], *step[4:])) \
+                or not (step[1] is None or is_number(step[1])):
+            raise ValueError(f"Courier '{courier}': invalid step {step}")
+        weight_steps.append((step[0], inf if step[1] is None else step[1], *step[2:]))
+    check_fields(courier, definition, ("handling", "increments", "surcharge"), is_number, "a number")
+    check_fields(courier, definition, ("surcharge_above",), lambda value: value is None or is_number(value),
+                 "a number or null")
+    check_fields(courier, definition, ("unit_decimals",),
+                 lambda value: value is None or isinstance(value, int) and not isinstance(value, bool),
+                 "an integer or null")
+    check_fields(courier, definition, ("applies_taxes", "vat_on_handling"),
+                 lambda value: isinstance(value, bool), "true or false")
+    book_cd = definition.get("book_cd")
+    if book_cd is not None:
+        if not isinstance(book_cd, dict):
+            raise ValueError(f"Courier '{courier}': 'book_cd' must be an object, not {book_cd!r}")
+        check_fields(courier, book_cd, BOOK_CD_FIELDS, is_number, "a number")
+        check_fields(courier, book_cd, ("round",), lambda value: isinstance(value, bool), "true or false")
+    unit = definition.get("unit", "kg")
+    if not isinstance(unit, str) or unit not in UNIT_FACTORS:
+        raise ValueError(f"Courier '{courier}': unknown unit '{unit}'")
+    handling = definition.get("handling", 0)
+    if definition.get("vat_on_handling", False):
+        handling = handling * (1 + VAT_RATE)
+    return TariffTable(weight_steps=weight_steps,
+                       handling=handling,
+                       increments=definition.get("increments", 0),
+                       surcharge=definition.get("surcharge", 0),
+                       surcharge_above=definition.get("surcharge_above"),
+                       unit_factor=UNIT_FACTORS[unit],
+                       unit_decimals=definition.get("unit_decimals"),
+                       book_cd=definition.get("book_cd"))
+
+def read_couriers(path=TARIFF_FILE):
+    # Entries of the courier registry from the tariff file; ValueError when
+    # the file is not valid
+    try:
+        with open(path, encoding="utf-8") as f:
+            definitions = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid tariff file '{path}': {e}") from e
+    if not isinstance(definitions, dict):
+        raise ValueError(f"Invalid tariff file '{path}': the couriers must be an object")
+    couriers = {}
+    for courier, definition in definitions.items():
+        tariff = compile_tariff(courier, definition)
+        if not isinstance(definition.get("name"), str):
+            raise ValueError(f"Courier '{courier}': no name")
+        couriers[courier] = {"name": definition["name"],
+                             "cost_function": partial(tariff_cost, tariff),
+                             "tariff": tariff,
+                             "applies_taxes": definition.get("applies_taxes", False)}
+    return couriers
@@ -0,0 +1,168 @@
+from bisect import bisect_right
+from math import ceil, inf
+import numpy as np
+from app.core.config import *
+
+TARIFF_SPAN = 1024  # Upper limit of the lookup keys of a single tariff inside a TariffSet
+
+def round_like_python(values, decimals):
+    # np.round scales by 10**decimals first, so it can differ from round() on
+    # values that sit at a half cent: those few are rounded one by one
+    rounded = np.round(values, decimals)
+    scaled = values * 10**decimals
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(float(value), decimals) for value in values[ties]]
+    return rounded
+
+class TariffTable:
+    # A courier tariff compiled once into breakpoint arrays.
+    # weight_steps: list of (min_weight, max_weight, rate, type[, fixed]) in the
+    # order they are matched: the first step containing the weight wins.
+    # Every step becomes a disjoint interval [low, high) charging
+    # base + per_unit * chargeable_weight, where chargeable_weight is the weight
+    # converted to the tariff units and rounded up to 'increments'.
+    # book_cd: rates of books and CDs, {"handling", "rate", "increments",
+    # "minimum", "round"} (all optional), where the freight is 'rate' per unit
+    # of the weight rounded up to 'increments' and not below 'minimum', then
+    # rounded to COST_DECIMALS unless "round" is false (the tax is computed on
+    # the freight before TransportCost rounds it); without a rate, the regular
+    # freight applies.
+    def __init__(self, weight_steps, handling=0, increments=0, surcharge=0,
+                 surcharge_above=None, unit_factor=1, unit_decimals=None, book_cd=None):
+        self.weight_steps = weight_steps
+        self.handling = handling
+        self.increments = increments
+        self.surcharge = surcharge
+        self.surcharge_above = surcharge_above
+        self.unit_factor = unit_factor
+        self.unit_decimals = unit_decimals
+        self.book_cd = book_cd
+        lows, highs, bases, per_units = [], [], [], []
+        covered = None
+        for step in weight_steps:
+            low, high, rate, type = step[:4]
+            fixed = step[4] if len(step) > 4 else 0
+            if covered is not None and low < covered:
+                low = covered   # Overlapping steps: the earlier one has priority
+            if low >= high:
+                continue
+            lows.append(low)
+            highs.append(high)
+            if type == 'f':
+                bases.append(rate)
+                per_units.append(0)
+            else:
+                bases.append(fixed)
+                per_units.append(rate)
+            covered = high if covered is None else max(covered, high)
+        self.lows = np.array(lows, dtype=float)
+        self.highs = np.array(highs, dtype=float)
+        self.bases = np.array(bases, dtype=float)
+        self.per_units = np.array(per_units, dtype=float)
+        self._lows = lows
+        self._highs = highs
+        self._bases = bases
+        self._per_units = per_units
+
+    def units(self, total_weight):
+        units = total_weight * self.unit_factor if self.unit_factor != 1 else total_weight
+        if self.unit_decimals is not None:
+            units = round(units, self.unit_decimals)
+        return units
+
+    def freight(self, total_weight):
+        # Variable (weight) rate for a single weight, None if out of range
+        units = self.units(total_weight)
+        step = bisect_right(self._highs, units)
+        if step == len(self._highs) or units < self._lows[step]:
+            return None
+        if self._per_units[step]:
+            if self.increments > 0:
+                units = ceil(units / self.increments) * self.increments
+            rate = self._bases[step] + units * self._per_units[step]
+        else:
+            rate = self._bases[step]
+        if self.surcharge and total_weight > self.surcharge_above:
+            rate += self.surcharge
+        return rate
+
+    def book_cd_rates(self, total_weight):
+        # (handling, freight) of books and CDs for a single weight
+        handling = self.book_cd.get("handling", self.handling)
+        if "rate" not in self.book_cd:
+            return handling, self.freight(total_weight)
+        units = self.units(total_weight)
+        increments = self.book_cd.get("increments", 0)
+        if increments > 0:
+            units = ceil(units / increments) * increments
+        freight = max(units, self.book_cd.get("minimum", 0)) * self.book_cd["rate"]
+        if self.book_cd.get("round", True):
+            freight = round(freight, COST_DECIMALS)
+        return handling, freight
+
+class TariffSet:
+    # Several tariffs flattened into a single breakpoint table so that an array
+    # of weights is priced for all of them with one searchsorted call. Each
+    # tariff's lookup keys are shifted by its position times TARIFF_SPAN.
+    def __init__(self, tables):
+        self.tables = tables
+        num_tables = len(tables)
+        self.offsets = np.arange(num_tables, dtype=float) * TARIFF_SPAN
+        self.handling = np.array([table.handling for table in tables], dtype=float)
+        self.increments = np.array([table.increments for table in tables], dtype=float)
+        self.surcharge = np.array([table.surcharge for table in tables], dtype=float)
+        self.surcharge_above = np.array([inf if table.surcharge_above is None else table.surcharge_above
+                                         for table in tables], dtype=float)
+        self.unit_factor = np.array([table.unit_factor for table in tables], dtype=float)
+        self.unit_decimals = [table.unit_decimals for table in tables]
+        self.lows = np.concatenate([np.minimum(table.lows, TARIFF_SPAN) for table in tables])
+        self.highs = np.concatenate([np.minimum(table.highs, TARIFF_SPAN) for table in tables])
+        self.bases = np.concatenate([table.bases for table in tables])
+        self.per_units = np.concatenate([table.per_units for table in tables])
+        self.owner = np.concatenate([np.full(len(table.lows), k) for k, table in enumerate(tables)])
+        self.keys = self.highs + self.offsets[self.owner]
+
+    def transport_costs(self, weights, total=True):
+        # Returns arrays of shape (number of tariffs, number of weights); weights
+        # outside every step of a tariff are priced as NaN
+        weights = np.asarray(weights, dtype=float)
+        units = weights[None, :] * self.unit_factor[:, None]
+        for k, decimals in enumerate(self.unit_decimals):
+            if decimals is not None:
+                units[k] = np.round(units[k], decimals)
+        rows = np.arange(len(self.tables))[:, None]
+        last = len(self.keys) - 1
+        step = np.searchsorted(self.keys, units + self.offsets[:, None], side='right')
+        step = np.minimum(step, last)
+        # Shifting by the offset may merge weights that sit within rounding error
+        # of a breakpoint: correct them against the unshifted bounds
+        step = np.where((units >= self.highs[step]) & (step < last) & (self.owner[np.minimum(step+1, last)] == rows),
+                        step + 1, step)
+        step = np.where((units < self.lows[step]) & (step > 0) & (self.owner[np.maximum(step-1, 0)] == rows),
+                        step - 1, step)
+        valid = (self.owner[step] == rows) & (self.lows[step] <= units) & (units < self.highs[step])
+        increments = self.increments[:, None]
+        chargeable = np.where(increments > 0,
+                              np.ceil(units / np.where(increments > 0, increments, 1)) * increments,
+                              units)
+        per_units = self.per_units[step]
+        freight = self.bases[step] + np.where(per_units != 0, chargeable * per_units, 0)
+        freight = freight + np.where(weights[None, :] > self.surcharge_above[:, None], self.surcharge[:, None], 0)
+        handling = np.broadcast_to(self.handling[:, None], freight.shape)
+        empty = weights[None, :] == 0
+        freight = np.where(empty, 0, np.where(valid, freight, np.nan))
+        handling = np.where(empty, 0, np.where(valid, handling, np.nan))
+        # Same rounding as TransportCost
+        tax = round_like_python(TAX_ON_FREIGHT * freight, COST_DECIMALS)
+        handling = round_like_python(handling, COST_DECIMALS)
+        freight = round_like_python(freight, COST_DECIMALS)
+        tfspu = round_like_python(freight * TFSPU_RATE, COST_DECIMALS)
+        total_cost = round_like_python(handling + freight + tax + tfspu, COST_DECIMALS)
+        if total:
+            return total_cost
+        return {"handling": handling,
+                "freight": freight,
+                "tax": tax,
+                "TFSPU": tfspu,
+                "total": total_cost}
@@ -0,0 +1,60 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from app.core.config import *
+
+class PhaseTimer:
+    # Wall time of the consecutive phases of a computation: lap(name) charges
+    # the time since the previous lap (or the start) to the phase 'name'
+    def __init__(self):
+        self.phases = {}
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0) + now - self.last
+        self.last = now
+        return self.phases[name]
+
+class TimingHistograms:
+    # Cumulative histograms of the phase durations observed (in seconds), with
+    # the upper bounds of TIMING_BUCKETS like Prometheus' histograms
+    def __init__(self, buckets=TIMING_BUCKETS):
+        self.buckets = sorted(buckets)
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, timings):
+        with self.lock:
+            for phase, seconds in timings.items():
+                histogram = self.histograms.setdefault(phase, {"count": 0,
+                                                               "sum": 0.0,
+                                                               "counts": [0] * (len(self.buckets) + 1)})
+                histogram["count"] += 1
+                histogram["sum"] += seconds
+                position = next((k for k, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+                histogram["counts"][position] += 1
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {}
+            for phase, histogram in self.histograms.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets + ["+Inf"], histogram["counts"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                snapshot[phase] = {"count": histogram["count"],
+                                   "sum": histogram["sum"],
+                                   "buckets": buckets}
+            return snapshot
+
+timing_metrics = TimingHistograms()
+
+def profile_report(profiler, top=PROFILE_TOP_FUNCTIONS):
+    # The functions of a cProfile run with the largest cumulative time
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+    return report.getvalue()
@@ -1,23 +1,14 @@
-from app.utils.courier_services import couriers
+import numpy as np
+from app.utils.courier_services import courier_ids, batch_cost_all
 from matplotlib import pyplot as plt
 
-weights_list = []
-for weight in range(100, 20000, 1):
-    weights_list.append(weight/1000)
-
-def compute_total_cost(cost_func, weights):
-    costs = []
-    for w in weights:
-        cost = cost_func(w)
-        if cost is not None:
-            costs.append(cost)  # Sums fixed and variable parts
-        else:
-            costs.append(0)  # Handle case where cost is None
-    return costs
+weights_list = np.arange(100, 20000, 1) / 1000
 
+# One vectorized pass prices every weight for every courier; weights outside
+# a courier's tariff come back as NaN and are plotted as 0
+costs = np.nan_to_num(batch_cost_all(weights_list), nan=0)
 plots = []
-for courier in couriers:
-    courier_costs = compute_total_cost(couriers[courier]["cost_function"], weights_list)
+for courier, courier_costs in zip(courier_ids, costs):
     plots.append((courier, courier_costs))
 
 plt.figure(figsize=(10, 6))
@@ -32,4 +23,4 @@ plt.ylim((0, None))
 plt.legend()
 plt.grid(True)
 
-plt.show()
\ No newline at end of file
+plt.show()
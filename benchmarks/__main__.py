@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+from app.core.config import *
+from app.utils.helpers import *
+from app.utils.courier_services import couriers
+from benchmarks.generators import WORKLOADS, generate_cart
+from benchmarks.runner import OPTIMIZERS, run_isolated, current_commit
+
+# Runs every optimizer and courier on the generated carts of n = 2..MAX_ITEMS
+# items and writes one JSON line per run:
+#   python -m benchmarks --workloads light mixed -o bench.jsonl
+# An optimizer that times out on a cart is not run on larger carts of the
+# same workload and courier. Compare two outputs with benchmarks.compare.
+
+def add_gap_to_best(records):
+    # Relative cost above the cheapest solution found by any optimizer
+    costs = [record["total_cost"] for record in records if record.get("total_cost") is not None]
+    best = min(costs) if costs else None
+    for record in records:
+        cost = record.get("total_cost")
+        record["gap_to_best"] = (cost - best) / best if cost is not None and best else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the optimizers on generated carts")
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--optimizers", nargs="+", default=OPTIMIZERS, choices=OPTIMIZERS)
+    parser.add_argument("--couriers", nargs="+", default=list(couriers), choices=list(couriers))
+    parser.add_argument("--min-items", type=int, default=2)
+    parser.add_argument("--max-items", type=int, default=MAX_ITEMS)
+    parser.add_argument("--exemptions", type=int, default=MAX_EXEMPTIONS_PER_YEAR)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default=DEFAULT_SOLVER_BACKEND, choices=SOLVER_BACKENDS,
+                        help="solver of the MILP optimizers")
+    parser.add_argument("--time-limit", type=float, default=MAX_OPTIM_TIME, help="seconds of MILP per run")
+    parser.add_argument("--timeout", type=float, default=2 * MAX_OPTIM_TIME, help="seconds before a run is killed")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file of results, '-' for stdout")
+    args = parser.parse_args()
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    commit = current_commit()
+    timed_out = set()
+    with output:
+        for workload in args.workloads:
+            for courier in args.couriers:
+                for num_items in range(args.min_items, args.max_items + 1):
+                    items = generate_cart(workload, num_items, args.seed)
+                    records = []
+                    for optimizer in args.optimizers:
+                        if (workload, courier, optimizer) in timed_out:
+                            continue
+                        record = run_isolated(optimizer, courier, items, args.exemptions,
+                                              args.time_limit, args.timeout, args.backend)
+                        if record["timed_out"]:
+                            timed_out.add((workload, courier, optimizer))
+                        records.append({"commit": commit,
+                                        "workload": workload,
+                                        "seed": args.seed,
+                                        "courier": courier,
+                                        "num_items": num_items,
+                                        "optimizer": optimizer,
+                                        "backend": args.backend,
+                                        **record})
+                        print(f"{workload} {courier} n={num_items} {optimizer}: "
+                              f"{record['status']} in {record['wall_time']:.2f} s", file=sys.stderr)
+                    add_gap_to_best(records)
+                    for record in records:
+                        output.write(json.dumps(record) + "\n")
+                    output.flush()
+
+if __name__ == "__main__":
+    main()
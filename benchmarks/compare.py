@@ -0,0 +1,53 @@
+import argparse
+import json
+import math
+from collections import defaultdict
+from app.core.config import *
+
+# Compares two outputs of the benchmark (for example of two commits):
+#   python -m benchmarks.compare before.jsonl after.jsonl
+# For every optimizer and workload it prints the geometric mean of the time
+# ratios (after / before) of the runs both completed, and counts the runs
+# that became more expensive, changed status or started timing out.
+
+def read_records(path):
+    with open(path) as f:
+        return {(record["workload"], record["seed"], record["courier"], record["num_items"], record["optimizer"]): record
+                for record in map(json.loads, f) if record}
+
+def compare(before, after):
+    groups = defaultdict(lambda: {"runs": 0, "log_ratio": 0.0, "timed": 0,
+                                  "costlier": 0, "status_changes": 0, "new_timeouts": 0})
+    for key, old in before.items():
+        new = after.get(key)
+        if new is None:
+            continue
+        group = groups[key[4], key[0]]
+        group["runs"] += 1
+        if new["timed_out"] and not old["timed_out"]:
+            group["new_timeouts"] += 1
+        if new["status"] != old["status"]:
+            group["status_changes"] += 1
+        if old.get("total_cost") is not None and new.get("total_cost") is not None \
+                and new["total_cost"] > old["total_cost"] + MIN_TOLERANCE:
+            group["costlier"] += 1
+        if not old["timed_out"] and not new["timed_out"] and old["wall_time"] > 0 and new["wall_time"] > 0:
+            group["timed"] += 1
+            group["log_ratio"] += math.log(new["wall_time"] / old["wall_time"])
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparison of two benchmark outputs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+    groups = compare(read_records(args.before), read_records(args.after))
+    print(f"{'optimizer':<12} {'workload':<9} {'runs':>5} {'time ratio':>10} {'costlier':>8} "
+          f"{'status':>6} {'timeouts':>8}")
+    for (optimizer, workload), group in sorted(groups.items()):
+        ratio = math.exp(group["log_ratio"] / group["timed"]) if group["timed"] else float("nan")
+        print(f"{optimizer:<12} {workload:<9} {group['runs']:>5} {ratio:>10.2f} {group['costlier']:>8} "
+              f"{group['status_changes']:>6} {group['new_timeouts']:>8}")
+
+if __name__ == "__main__":
+    main()
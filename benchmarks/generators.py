@@ -0,0 +1,33 @@
+import random
+from app.core.config import *
+
+# CART GENERATORS
+# ===============
+# Seeded carts of n items (name, price, weight). The same workload, size and
+# seed always give the same cart, so that runs of different commits compare.
+
+def light_item(rng):
+    return rng.uniform(5, 60), rng.uniform(0.05, 0.8)
+
+def heavy_item(rng):
+    return rng.uniform(20, 150), rng.uniform(4, 12)
+
+def near_cap_item(rng):
+    # Prices close to MAX_PRICE_EXEMPTION: pairs rarely fit in one package
+    return rng.uniform(0.6 * MAX_PRICE_EXEMPTION, MAX_PRICE_EXEMPTION - 0.01), rng.uniform(0.2, 3)
+
+def mixed_item(rng):
+    return rng.choice((light_item, heavy_item, near_cap_item))(rng)
+
+WORKLOADS = {"light": light_item,
+             "heavy": heavy_item,
+             "near_cap": near_cap_item,
+             "mixed": mixed_item}
+
+def generate_cart(workload, num_items, seed=0):
+    rng = random.Random(f"{workload}-{num_items}-{seed}")
+    items = []
+    for i in range(num_items):
+        price, weight = WORKLOADS[workload](rng)
+        items.append((f"{workload}_{i+1}", round(price, COST_DECIMALS), round(weight, 2)))
+    return items
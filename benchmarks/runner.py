@@ -0,0 +1,104 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from app.core.config import *
+from app.utils.helpers import *
+from app.services.heuristic_optimizer import heuristic_optimization
+from app.services.dp_optimizer import dp_optimization
+from app.services.brute_force_optimizer import brute_force_optimization
+from app.services.decomposition_optimizer import decomposition_optimization
+from app.services.milp_optimizer import milp_optimization
+
+# Each optimization runs in a process of its own: its peak memory, caches and
+# solver log belong to it only, and a search that takes too long is killed.
+# The optimizers are imported here so that the import time is not measured
+OPTIMIZERS = ["heuristic", "dp", "brute_force", "decomposition", "milp_bigm", "milp_hull",
+              "milp_bigm_pulp", "milp_hull_pulp"]
+
+def optimize(optimizer, courier, items, max_exemptions, time_limit, backend, debug_dir):
+    if optimizer == "heuristic":
+        return heuristic_optimization(courier, items, max_exemptions=max_exemptions)
+    if optimizer == "dp":
+        return dp_optimization(courier, items, max_exemptions=max_exemptions, time_limit=time_limit)
+    if optimizer == "brute_force":
+        return brute_force_optimization(courier, items, max_exemptions=max_exemptions)
+    if optimizer == "decomposition":
+        return decomposition_optimization(courier, items, max_exemptions=max_exemptions, time_limit=time_limit)
+    return milp_optimization(courier, items,
+                             max_exemptions=max_exemptions,
+                             time_limit=time_limit,
+                             formulation=optimizer.split("_")[1],
+                             assembly="pulp" if optimizer.endswith("_pulp") else DEFAULT_MILP_ASSEMBLY,
+                             backend=backend,
+                             debug_dir=debug_dir)
+
+def read_cbc_log(path):
+    # Nodes and relative gap of a CBC run from its log; the gap is only
+    # printed when the search stopped before proving optimality
+    with open(path) as f:
+        log = f.read()
+    nodes = re.search(r"Enumerated nodes:\s+(\d+)", log)
+    gap = re.search(r"Gap:\s+([-\d.e]+)", log)
+    return {"nodes": int(nodes.group(1)) if nodes else None,
+            "gap": float(gap.group(1)) if gap else (0.0 if "Optimal solution found" in log else None)}
+
+def run_case(optimizer, courier, items, max_exemptions, time_limit, backend, connection):
+    debug_dir = tempfile.mkdtemp(prefix="benchmark_") if optimizer.startswith("milp") else None
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution = optimize(optimizer, courier, items, max_exemptions, time_limit, backend, debug_dir)
+    wall_time = time.perf_counter() - start_time
+    record = {"status": solution.status,
+              "total_cost": round(solution.total_cost, COST_DECIMALS) if solution.num_packages else None,
+              "packages": solution.num_packages,
+              "wall_time": wall_time,
+              "solver_time": solution.time_spent,
+              "nodes": solution.solutions if optimizer == "brute_force" else None,
+              "gap": 0.0 if solution.status == "Optimal" else None,
+              "peak_memory_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              "solver_peak_memory_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss or None}
+    if debug_dir is not None and backend == "cbc":
+        record.update(read_cbc_log(os.path.join(debug_dir, "model_info.log")))
+        shutil.rmtree(debug_dir, ignore_errors=True)
+    connection.send(record)
+
+def run_isolated(optimizer, courier, items, max_exemptions, time_limit, timeout, backend=DEFAULT_SOLVER_BACKEND):
+    # Record of one optimization, with timed_out set when it was killed
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_case,
+                                      args=(optimizer, courier, items, max_exemptions, time_limit, backend, sender))
+    start_time = time.perf_counter()
+    process.start()
+    sender.close()
+    timed_out = not receiver.poll(timeout)
+    record = None
+    if not timed_out:
+        try:
+            record = receiver.recv()
+        except EOFError:    # The optimization failed
+            pass
+    wall_time = time.perf_counter() - start_time
+    process.join(1)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    if record is None:
+        return {"status": "Timeout" if timed_out else "Failed",
+                "wall_time": wall_time,
+                "timed_out": timed_out}
+    record["timed_out"] = False
+    return record
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
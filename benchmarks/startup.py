@@ -0,0 +1,63 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Import time of the entry points of the API, of the solver workers and of
+# the courier registry, each measured in fresh interpreters (the best of
+# --repeat runs), and the heavy modules each one loads:
+#   python -m benchmarks.startup
+# Exits with status 1 when an entry point loads a module it should not or
+# takes longer than its budget, so that slow imports do not creep back in.
+
+HEAVY_MODULES = ["numpy", "pulp", "pydantic", "fastapi", "matplotlib", "highspy", "scipy"]
+ENTRY_POINTS = {
+    # Entry point: (budget in seconds, heavy modules it must not load)
+    "app.core.config": (0.05, HEAVY_MODULES),
+    "app.utils.courier_services": (0.5, ["pulp", "pydantic", "fastapi", "matplotlib", "highspy", "scipy"]),
+    "app.services.solver_pool": (0.3, HEAVY_MODULES),
+    "app.main": (3.0, ["pulp", "matplotlib", "highspy", "scipy"]),
+}
+MEASUREMENT = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start_time,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def import_time(module, repeat):
+    # Fastest import of the module in a new interpreter and the heavy modules
+    # it loaded, or the error of an import that failed
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-c", MEASUREMENT.format(module=module, heavy=HEAVY_MODULES)],
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            return {"error": process.stderr.strip().splitlines()[-1]}
+        runs.append(json.loads(process.stdout.splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the entry points")
+    parser.add_argument("--repeat", type=int, default=5, help="imports of each entry point")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor applied to every budget")
+    args = parser.parse_args()
+    failed = False
+    for module, (budget, forbidden) in ENTRY_POINTS.items():
+        run = import_time(module, max(args.repeat, 1))
+        if "error" in run:
+            failed = True
+            print(f"{module}: FAILED to import: {run['error']}")
+            continue
+        budget *= args.scale
+        problems = [f"loads {name}" for name in run["loaded"] if name in forbidden]
+        if run["seconds"] > budget:
+            problems.append(f"over its budget of {budget:.2f} s")
+        failed = failed or bool(problems)
+        print(f"{module}: {run['seconds']:.3f} s, loads {', '.join(run['loaded']) or 'no heavy module'}"
+              + (f" -- FAILED: {'; '.join(problems)}" if problems else ""))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
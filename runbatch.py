@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+from app.utils.helpers import *
+from app.services.batch import run_batch
+
+# Solves a JSONL file of OptimizationRequest records (one cart per line) and
+# writes one OptimizationResult line per record, in the same order:
+#   python runbatch.py carts.jsonl -o results.jsonl --checkpoint results.ckpt
+# With a checkpoint, running the same command again resumes an interrupted batch.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch optimization of carts")
+    parser.add_argument("input", help="JSONL file of optimization requests, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file of results, '-' for stdout")
+    parser.add_argument("--time-limit", type=float, default=MAX_OPTIM_TIME, help="seconds of MILP per cart")
+    parser.add_argument("--workers", type=int, default=SOLVER_WORKERS, help="solver processes")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file to resume the batch")
+    args = parser.parse_args()
+    if args.checkpoint is not None and args.output == "-":
+        parser.error("a checkpoint needs an output file")
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    if args.output == "-":
+        output_file = sys.stdout.buffer
+    elif args.checkpoint is not None and os.path.exists(args.output):
+        output_file = open(args.output, "r+b")
+    else:
+        output_file = open(args.output, "wb")
+    with input_file, output_file:
+        run_batch(input_file, output_file,
+                  time_limit=args.time_limit,
+                  workers=args.workers,
+                  checkpoint_path=args.checkpoint)
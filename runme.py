@@ -1,8 +1,7 @@
-from app.services.brute_force_optimizer import *
-from app.services.milp_optimizer import *
 from app.utils.courier_services import *
 from app.data.purchased_items import items
-from app.utils.helpers import read_json_input
+from app.utils.helpers import read_json_input, new_debug_dir, input_is_valid
+from app.utils.package_costs import package_cost_stats
 
 # PARAMETERS
 # ==========
@@ -17,12 +16,23 @@ if not input_is_valid(key=key,
 
 # OPTIMIZATION STRATEGY
 # =====================
-optimization_strategy = 1   # 0 = brute force, 1 = MILP
+optimization_strategy = 1   # 0 = brute force, 1 = MILP, 2 = dynamic programming, 3 = heuristic, 4 = decomposition heuristic
 
+debug_dir = new_debug_dir(selected_courier)
+method_options = {}
+
+# Only the optimizer used is imported
 if optimization_strategy==0:
-    method = brute_force_optimization
+    from app.services.brute_force_optimizer import brute_force_optimization as method
 elif optimization_strategy==1:
-    method = milp_optimization
+    from app.services.milp_optimizer import milp_optimization as method
+    method_options = {"debug_dir": debug_dir}
+elif optimization_strategy==2:
+    from app.services.dp_optimizer import dp_optimization as method
+elif optimization_strategy==3:
+    from app.services.heuristic_optimizer import heuristic_optimization as method
+elif optimization_strategy==4:
+    from app.services.decomposition_optimizer import decomposition_optimization as method
 
 # OPTIMIZE
 # ========
@@ -30,9 +40,15 @@ optimal_solution = method(courier=selected_courier,
                           items=purchased_items,
                           discount_rate=discount_rate,
                           max_exemptions=fee_exemptions,
-                          print_return_value=True)
+                          print_return_value=True,
+                          **method_options)
 
 # DISPLAY/SAVE THE RESULTS
 # ========================
 optimal_solution.show()
-optimal_solution.save_to_file()
\ No newline at end of file
+optimal_solution.save_to_file(directory=debug_dir)
+stats = package_cost_stats()
+print(f"\nPackage cost lookups: {stats['package']['hits'] + stats['package']['misses']} "
+      f"(hit rate {stats['package']['hit_rate']:.1%}), "
+      f"transport lookups: {stats['transport']['hits'] + stats['transport']['misses']} "
+      f"(hit rate {stats['transport']['hit_rate']:.1%})")
@@ -0,0 +1,118 @@
+import io
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.courier_services import couriers
+from app.services.batch import run_batch
+
+PURCHASES = [{"name": "book", "price": 30.0, "weight": 0.8},
+             {"name": "shoes", "price": 85.5, "weight": 1.2},
+             {"name": "phone", "price": 120.0, "weight": 0.4},
+             {"name": "jacket", "price": 64.9, "weight": 1.6}]
+
+def request(**changes):
+    return {"key": "k", "purchases": PURCHASES, "courier_service": "UBX",
+            "import_fee_exemptions": 1, "discount_rate": 0, **changes}
+
+@pytest.fixture(scope="module")
+def client():
+    # The context runs the shutdown handler, which stops the solver pool
+    with TestClient(app) as client:
+        yield client
+
+def test_compare_ranks_every_courier(client):
+    body = request()
+    del body["courier_service"]
+    response = client.post("/api/v1/optimize/compare", json=body)
+    assert response.status_code == 200
+    comparison = response.json()
+    assert sorted(entry["courier_id"] for entry in comparison) == sorted(couriers)
+    costs = [entry["result"]["total_cost"] for entry in comparison]
+    assert costs == sorted(costs)
+    for entry in comparison:
+        assert entry["lower_bound"] <= entry["result"]["total_cost"] + 0.01
+    # The winner is solved exactly, never skipped for its heuristic answer
+    assert not comparison[0]["skipped"]
+    assert comparison[0]["result"]["status"] == "Optimal"
+
+def test_batch_returns_a_line_per_request_in_order(client):
+    lines = [json.dumps(request()),
+             "",
+             "{not json",
+             json.dumps(request(courier_service="NOPE")),
+             json.dumps(request(purchases=PURCHASES[:2], fast=True))]
+    response = client.post("/api/v1/optimize/batch", content="\n".join(lines))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert len(results) == 4
+    assert results[0]["status"] == "Optimal"
+    assert results[1]["error"].startswith("Invalid request")
+    assert results[2] == {"error": "Invalid inputs."}
+    assert [item["name"] for package in results[3]["packages"] for item in package["items"]] \
+        == ["book", "shoes"]
+
+def test_run_batch_resumes_from_its_checkpoint(tmp_path):
+    lines = [json.dumps(request(purchases=PURCHASES[:k], fast=True)) + "\n" for k in (1, 2, 3)]
+    checkpoint = tmp_path / "results.ckpt"
+    with open(tmp_path / "results.jsonl", "wb") as output_file:
+        assert run_batch(lines[:2], output_file, workers=1, checkpoint_path=str(checkpoint),
+                         progress_file=io.StringIO()) == 2
+        output_file.write(b"partial line")  # Written after the checkpoint
+    with open(tmp_path / "results.jsonl", "r+b") as output_file:
+        assert run_batch(lines, output_file, workers=1, checkpoint_path=str(checkpoint),
+                         progress_file=io.StringIO()) == 3
+    results = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text().splitlines()]
+    assert [len([item for package in result["packages"] for item in package["items"]])
+            for result in results] == [1, 2, 3]
+
+def wait_for_job(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        job = client.get(f"/api/v1/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running") or time.time() > deadline:
+            return job
+        time.sleep(0.1)
+
+def test_job_finishes_with_its_incumbent_and_result(client):
+    created = client.post("/api/v1/jobs", json=request(discount_rate=0.05))
+    assert created.status_code == 202
+    job = wait_for_job(client, created.json()["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["status"] == "Optimal"
+    assert job["incumbent"]["total_cost"] >= job["result"]["total_cost"] - 0.01
+
+def test_stopped_job_keeps_the_best_solution_found(client):
+    job_id = client.post("/api/v1/jobs", json=request(discount_rate=0.1)).json()["job_id"]
+    assert client.post(f"/api/v1/jobs/{job_id}/stop").status_code == 200
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "done"
+    assert job["result"]["packages"]
+
+def test_cancelled_job_has_no_result(client):
+    job_id = client.post("/api/v1/jobs", json=request(discount_rate=0.15)).json()["job_id"]
+    cancelled = client.delete(f"/api/v1/jobs/{job_id}")
+    assert cancelled.status_code == 200
+    assert cancelled.json()["status"] == "cancelled"
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "cancelled"
+    assert job["result"] is None
+    assert client.delete("/api/v1/jobs/unknown").status_code == 404
+
+@pytest.mark.parametrize("changes", [
+    {"courier_service": "NOPE"},
+    {"backend": "nope"},
+    {"purchases": [{"name": "phone", "price": -1.0, "weight": 0.4}]},
+    {"purchases": PURCHASES * 100},    # More than MAX_ITEMS
+])
+def test_invalid_optimization_is_rejected(client, changes):
+    response = client.post("/api/v1/optimize", json=request(**changes))
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid inputs."}
+
+def test_optimization_returns_the_solution(client):
+    response = client.post("/api/v1/optimize", json=request())
+    assert response.status_code == 200
+    assert response.json()["status"] == "Optimal"
@@ -0,0 +1,40 @@
+import pytest
+from app.core.config import MAX_PRICE_EXEMPTION, MAX_WEIGHT_EXEMPTION
+from app.utils.package_costs import import_fee_of, transport_total
+from app.services.brute_force_optimizer import brute_force_optimization, fees_after_exemptions
+from test_dp_optimizer import random_cart
+
+def set_partitions(items):
+    if not items:
+        yield []
+        return
+    first, rest = items[0], items[1:]
+    for partition in set_partitions(rest):
+        yield [[first]] + partition
+        for j in range(len(partition)):
+            yield partition[:j] + [[first] + partition[j]] + partition[j + 1:]
+
+def exhaustive_cost(courier, items, max_exemptions):
+    best = float("inf")
+    for partition in set_partitions(items):
+        prices = [sum(item[1] for item in package) for package in partition]
+        weights = [sum(item[2] for item in package) for package in partition]
+        if max(prices) > MAX_PRICE_EXEMPTION or max(weights) > MAX_WEIGHT_EXEMPTION:
+            continue
+        best = min(best, sum(transport_total(courier, weight) for weight in weights)
+                   + fees_after_exemptions([import_fee_of(price) for price in prices], max_exemptions))
+    return best
+
+@pytest.mark.parametrize("courier", ["UBX", "XUR"])
+@pytest.mark.parametrize("seed", [3, 4])
+def test_pruned_search_matches_exhaustive_enumeration(courier, seed):
+    items = random_cart(seed, 7)
+    solution = brute_force_optimization(courier, items, max_exemptions=2)
+    assert solution.status == "Optimal"
+    assert solution.total_cost == pytest.approx(exhaustive_cost(courier, items, 2), abs=0.005)
+    # The bounds cut the search well below the 877 partitions of 7 items
+    assert solution.solutions < 877
+
+def test_item_over_the_exemption_limits_is_infeasible():
+    solution = brute_force_optimization("UBX", [("tv", 450.0, 9.0), ("cable", 12.0, 0.2)])
+    assert solution.status == "Infeasible"
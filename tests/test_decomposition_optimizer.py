@@ -0,0 +1,22 @@
+import pytest
+from app.services.dp_optimizer import dp_optimization
+from app.services.decomposition_optimizer import decomposition_optimization
+from test_dp_optimizer import random_cart
+
+@pytest.mark.parametrize("courier", ["UBX", "XUR"])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_heuristic_stays_close_to_the_optimum(courier, seed):
+    items = random_cart(seed, 8)
+    optimum = dp_optimization(courier, items, max_exemptions=1).total_cost
+    solution = decomposition_optimization(courier, items, max_exemptions=1)
+    assert sorted(item for k in range(solution.num_packages) for item in solution.package_items(k)) == sorted(items)
+    assert solution.total_cost >= optimum - 0.005
+    # A heuristic: a few percent above the optimum, and "Optimal" only when proven
+    assert solution.total_cost <= 1.05 * optimum
+    assert solution.status == "Heuristic" or solution.total_cost == pytest.approx(optimum, abs=0.005)
+
+def test_forced_packing_is_optimal():
+    items = [("tv", 180.0, 6.0), ("console", 190.0, 3.5), ("laptop", 175.0, 2.2)]
+    solution = decomposition_optimization("UBX", items, max_exemptions=1)
+    assert solution.status == "Optimal"
+    assert solution.total_cost == pytest.approx(dp_optimization("UBX", items, max_exemptions=1).total_cost, abs=0.005)
@@ -0,0 +1,51 @@
+import contextlib
+import io
+import random
+import pytest
+from app.core.config import DP_MAX_ITEMS
+from app.services.dp_optimizer import dp_optimization
+from app.services.brute_force_optimizer import brute_force_optimization
+from app.services.milp_optimizer import milp_optimization
+
+def random_cart(seed, num_items):
+    generator = random.Random(seed)
+    return [(f"item{k}", round(generator.uniform(5, 150), 2), round(generator.uniform(0.1, 4), 2))
+            for k in range(num_items)]
+
+def test_empty_cart():
+    solution = dp_optimization("UBX", [])
+    assert solution.status == "Optimal"
+    assert solution.num_packages == 0
+    assert solution.total_cost == 0
+
+def test_cart_over_the_size_limit_is_not_solved():
+    solution = dp_optimization("UBX", random_cart(1, DP_MAX_ITEMS + 1))
+    assert solution.status == "Not Solved"
+    assert solution.num_packages == 0
+
+def test_search_over_the_time_limit_is_not_solved():
+    solution = dp_optimization("UBX", random_cart(1, 8), time_limit=-1)
+    assert solution.status == "Not Solved"
+
+@pytest.mark.parametrize("courier", ["UBX", "MBX", "XUR", "PMO"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_matches_brute_force(courier, seed):
+    items = random_cart(seed, 5)
+    dp = dp_optimization(courier, items, max_exemptions=1)
+    brute_force = brute_force_optimization(courier, items, max_exemptions=1)
+    assert dp.status == brute_force.status == "Optimal"
+    assert sorted(item for k in range(dp.num_packages) for item in dp.package_items(k)) == sorted(items)
+    assert dp.total_cost == pytest.approx(brute_force.total_cost, abs=0.005)
+
+@pytest.mark.parametrize("formulation", ["bigm", "hull"])
+@pytest.mark.parametrize("assembly", ["matrix", "pulp"])
+@pytest.mark.parametrize("courier", ["UBX", "MBX", "XUR", "PMO"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_milp_matches_dp(formulation, assembly, courier, seed):
+    items = random_cart(seed, 5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        milp = milp_optimization(courier, items, max_exemptions=1, formulation=formulation, assembly=assembly)
+    assert milp.status == "Optimal"
+    assert sorted(item for k in range(milp.num_packages) for item in milp.package_items(k)) == sorted(items)
+    # The MILP does not round the cost of each package, which may tie packings a cent apart
+    assert milp.total_cost == pytest.approx(dp_optimization(courier, items, max_exemptions=1).total_cost, abs=0.015)
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import pytest
+from app.services.dp_optimizer import dp_optimization
+from app.services.incremental_optimizer import (cart_after_changes, repair_packing, touched_packages,
+                                                freed_packages, incremental_optimization)
+from test_dp_optimizer import random_cart
+
+def solved_cart(courier, items, max_exemptions):
+    solution = dp_optimization(courier, items, max_exemptions=max_exemptions)
+    return [solution.package_items(k) for k in range(solution.num_packages)]
+
+def test_cart_after_changes():
+    packages = [[("a", 10.0, 1.0), ("b", 20.0, 2.0)], [("c", 30.0, 3.0)]]
+    items, packing = cart_after_changes(packages, [("d", 40.0, 4.0)], ["c"])
+    assert items == [("a", 10.0, 1.0), ("b", 20.0, 2.0), ("d", 40.0, 4.0)]
+    assert packing == [[0, 1]]
+    assert cart_after_changes(packages, [], ["e"]) == (None, None)
+
+def test_repair_places_every_item_and_keeps_the_rest():
+    previous = random_cart(6, 8)
+    packages = solved_cart("UBX", previous, 2)
+    items, previous_packing = cart_after_changes(packages, [("new", 42.0, 1.3)], [previous[0][0]])
+    packing, cost, exempted = repair_packing("UBX", items, previous_packing, 2)
+    assert sorted(i for package in packing for i in package) == list(range(len(items)))
+    assert len(exempted) <= 2
+    # The repaired packages are always freed, the others only within max_items
+    touched = touched_packages(packing, previous_packing)
+    assert touched
+    freed = freed_packages(packing, previous_packing, max_items=0)
+    assert freed == touched
+    freed = freed_packages(packing, previous_packing, max_items=len(items))
+    assert sorted(freed) == list(range(len(packing)))
+
+@pytest.mark.parametrize("courier", ["UBX", "XUR"])
+def test_small_cart_is_repacked_to_the_optimum(courier):
+    previous = random_cart(7, 6)
+    packages = solved_cart(courier, previous, 1)
+    added = [("new", 75.0, 2.2), ("other", 18.5, 0.6)]
+    items, previous_packing = cart_after_changes(packages, added, [previous[2][0]])
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution = incremental_optimization(courier, items, previous_packing, max_exemptions=1)
+    assert solution.status == "Optimal"
+    assert solution.total_cost == pytest.approx(dp_optimization(courier, items, max_exemptions=1).total_cost,
+                                                abs=0.015)
@@ -0,0 +1,19 @@
+import sys
+import pytest
+from app.utils.lazy_imports import LazyModule
+from benchmarks.startup import ENTRY_POINTS, import_time
+
+def test_module_is_imported_on_first_attribute_access():
+    sys.modules.pop("colorsys", None)
+    colorsys = LazyModule("colorsys")
+    assert "colorsys" not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+
+@pytest.mark.parametrize("module", list(ENTRY_POINTS))
+def test_entry_points_do_not_load_heavy_modules(module):
+    # Only the modules loaded are checked here: the time budgets are left to
+    # python -m benchmarks.startup, on a quiet machine
+    run = import_time(module, repeat=1)
+    assert "error" not in run
+    assert not set(run["loaded"]) & set(ENTRY_POINTS[module][1])
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import queue
+import threading
+import pulp
+import pytest
+from app.services.dp_optimizer import dp_optimization
+from app.services.matrix_model import milp_matrix_model, read_cbc_solution, solve_with_cbc, write_mps
+from app.services.milp_optimizer import milp_optimization
+from test_dp_optimizer import random_cart
+
+def quiet_milp(*args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return milp_optimization(*args, **kwargs)
+
+def test_progress_reports_incumbents_and_bounds():
+    progress = queue.Queue()
+    solution = quiet_milp("UBX", random_cart(5, 8), max_exemptions=2, progress=progress)
+    reports = []
+    while not progress.empty():
+        reports.append(progress.get())
+    assert solution.status == "Optimal"
+    assert reports
+    assert [report["elapsed"] for report in reports] == sorted(report["elapsed"] for report in reports)
+    last = reports[-1]
+    assert last["bound"] <= last["incumbent"] + 0.01
+    assert last["incumbent"] == pytest.approx(solution.total_cost, abs=0.05)
+
+def test_stopped_before_the_search_is_not_solved():
+    stop = threading.Event()
+    stop.set()
+    solution = quiet_milp("UBX", random_cart(5, 8), max_exemptions=2, stop=stop)
+    assert solution.status == "Not Solved"
+    assert solution.num_packages == 0
+
+def test_mps_file_reads_back_as_the_same_model(tmp_path):
+    items = random_cart(3, 5)
+    model, columns = milp_matrix_model("UBX", items, 3, 1)
+    path = str(tmp_path / "model.mps")
+    write_mps(model, path)
+    _, problem = pulp.LpProblem.fromMPS(path)
+    assert len(problem.constraints) == model.num_rows
+    assert len(problem.variables()) == model.num_columns
+    problem.solve(pulp.PULP_CBC_CMD(msg=False))
+    status, values = solve_with_cbc(model, 30)
+    assert status == "Optimal"
+    assert model.arrays()[2] @ values == pytest.approx(pulp.value(problem.objective), abs=1e-6)
+    # Every item in one package
+    chosen = columns["item_of"][values[columns["x"]] > 0.5]
+    assert sorted(chosen.tolist()) == list(range(len(items)))
+
+@pytest.mark.parametrize("header, status", [
+    ("Optimal - objective value 12.5", "Optimal"),
+    ("Stopped on time - objective value 14", "Feasible"),
+    ("Infeasible - objective value 0", "Infeasible"),
+    ("Stopped on time (no integer solution - continuous used) - objective value 3", "Not Solved"),
+])
+def test_cbc_solution_status_and_values(tmp_path, header, status):
+    path = tmp_path / "model.sol"
+    path.write_text(f"{header}\n      0 C0                  1                       0\n"
+                    f"**    2 C2                0.5                       0\n")
+    assert read_cbc_solution(str(path), 3)[0] == status
+    assert read_cbc_solution(str(path), 3)[1].tolist() == [1, 0, 0.5]
+
+@pytest.mark.parametrize("assembly", ["matrix", "pulp"])
+@pytest.mark.parametrize("courier, items, max_exemptions", [
+    # Carts whose hull model CBC used to report "Optimal" above the optimum
+    ("MLT", [("i0", 120.7, 5.296), ("i1", 64.52, 5.913), ("i2", 19.73, 1.736),
+             ("i3", 8.07, 0.612), ("i4", 12.39, 7.342), ("i5", 45.38, 1.308)], 2),
+    ("UBX", random_cart(1, 6), 1),
+    ("GBX", random_cart(2, 6), 2),
+    ("BBX", random_cart(4, 7), 0),
+])
+def test_hull_formulation_matches_dp(assembly, courier, items, max_exemptions):
+    solution = quiet_milp(courier, items, max_exemptions=max_exemptions, formulation="hull", assembly=assembly)
+    assert solution.status == "Optimal"
+    assert solution.total_cost == pytest.approx(dp_optimization(courier, items, max_exemptions=max_exemptions).total_cost,
+                                                abs=0.015)
+
+@pytest.mark.parametrize("formulation", ["bigm", "hull"])
+@pytest.mark.parametrize("assembly", ["matrix", "pulp"])
+def test_units_rounded_to_the_tariff_decimals(formulation, assembly):
+    # 3.176 kg is 7.0019 lb, which XUR rounds to 7.00 lb and charges as 7 lb
+    items = [("i0", 81.94, 1.395), ("i1", 54.42, 5.345), ("i2", 100.12, 3.176),
+             ("i3", 121.18, 0.522), ("i4", 46.65, 0.814), ("i5", 52.1, 6.364)]
+    solution = quiet_milp("XUR", items, max_exemptions=1, formulation=formulation, assembly=assembly)
+    assert solution.status == "Optimal"
+    assert solution.total_cost == pytest.approx(dp_optimization("XUR", items, max_exemptions=1).total_cost, abs=0.005)
+
+@pytest.mark.parametrize("backend, package", [("highs", "highspy"), ("scipy", "scipy")])
+@pytest.mark.parametrize("courier, seed", [("UBX", 5), ("MLT", 6), ("XUR", 7)])
+def test_in_process_backends_match_dp(backend, package, courier, seed):
+    pytest.importorskip(package)
+    items = random_cart(seed, 6)
+    solution = quiet_milp(courier, items, max_exemptions=1, backend=backend)
+    assert solution.status == "Optimal"
+    # "Optimal" prices the packages unrounded, within cents per package of the rounded optimum
+    best = dp_optimization(courier, items, max_exemptions=1).total_cost
+    assert best - 0.005 <= solution.total_cost <= best + 0.02 * solution.num_packages
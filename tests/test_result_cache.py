@@ -0,0 +1,45 @@
+from app.models.classes import PackageSolution
+from app.utils.package_costs import build_package
+from app.services.result_cache import ResultCache, cache_key, remap_items
+
+ITEMS = [("book", 30.0, 0.8), ("shoes", 85.5, 1.2), ("phone", 120.0, 0.4)]
+
+def optimization(items, **options):
+    return {"courier": "UBX", "items": items, "discount_rate": 0, "max_exemptions": 3, **options}
+
+def result(items, **extra):
+    solution = PackageSolution(courier_id="UBX", courier="Urubox", status="Optimal")
+    solution.add_package(build_package("UBX", items[:2], exempt=True))
+    solution.add_package(build_package("UBX", items[2:], exempt=True))
+    return {**solution.to_json(), **extra}
+
+def test_profiled_results_are_not_stored():
+    cache = ResultCache()
+    cache.put("milp", optimization(ITEMS, profile=True), result(ITEMS, profile="report"))
+    cache.put("milp", optimization(ITEMS, debug_dir="/tmp/debug"), result(ITEMS))
+    assert cache.stats()["entries"] == 0
+    assert cache.get("milp", optimization(ITEMS)) is None
+
+def test_reordered_and_renamed_cart_hits_with_the_callers_names():
+    cache = ResultCache()
+    cache.put("milp", optimization(ITEMS), result(ITEMS))
+    renamed = [("handset", 120.0, 0.4), ("novel", 30.0, 0.8), ("sneakers", 85.5, 1.2)]
+    cached = cache.get("milp", optimization(renamed))
+    assert cached is not None
+    names = [[item["name"] for item in package["items"]] for package in cached["packages"]]
+    assert names == [["novel", "sneakers"], ["handset"]]
+    assert cached["total_cost"] == result(ITEMS)["total_cost"]
+
+def test_cache_key_ignores_names_and_order_but_not_options():
+    reordered = [("b", 85.5, 1.2), ("c", 120.0, 0.4), ("a", 30.0, 0.8)]
+    assert cache_key("milp", optimization(ITEMS)) == cache_key("milp", optimization(reordered))
+    assert cache_key("milp", optimization(ITEMS)) != cache_key("dp", optimization(ITEMS))
+    assert cache_key("milp", optimization(ITEMS)) != cache_key("milp", optimization(ITEMS, max_exemptions=2))
+    assert cache_key("milp", optimization(ITEMS)) != cache_key("milp", optimization(ITEMS, mip_gap=0.01))
+
+def test_duplicate_items_keep_their_multiplicity():
+    items = [("a", 10.0, 1.0), ("b", 10.0, 1.0), ("c", 50.0, 2.0)]
+    stored = remap_items(result(items), items, to_canonical=True)
+    assert sorted(k for package in stored["packages"] for k in package["items"]) == [0, 1, 2]
+    restored = remap_items(stored, items, to_canonical=False)
+    assert restored["packages"] == result(items)["packages"]
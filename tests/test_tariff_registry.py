@@ -0,0 +1,58 @@
+import json
+import os
+import pytest
+from app.core.config import TARIFF_FILE
+from app.utils.tariff_registry import read_couriers
+from app.utils.courier_services import couriers, refresh_tariffs, tariff_file
+
+def tariff_definitions():
+    with open(TARIFF_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_tariffs(path, definitions):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(definitions, f)
+    return str(path)
+
+def test_read_couriers_of_the_tariff_file():
+    entries = read_couriers(TARIFF_FILE)
+    assert list(entries) == list(tariff_definitions())
+    assert entries["UBX"]["cost_function"](1.5) > 0
+
+@pytest.mark.parametrize("courier, change", [
+    ("UBX", 5),                                         # Entry that is not an object
+    ("UBX", {"name": "Urubox", "steps": [[0, "1", 10, "f"]]}),
+    ("UBX", {"name": "Urubox", "steps": [[0, 1, 10]]}),
+    ("UBX", {"name": "Urubox", "steps": [[0, 1, 10, "x"]]}),
+    ("UBX", {"name": "Urubox", "steps": []}),
+    ("UBX", {"steps": [[0, 1, 10, "f"]]}),
+    ("MBX", {"book_cd": 3}),
+    ("MBX", {"book_cd": {"rate": "9.9"}}),
+    ("MBX", {"handling": "6"}),
+    ("XUR", {"unit": ["lb"]}),
+    ("XUR", {"unit_decimals": 2.5}),
+])
+def test_invalid_entries_raise_value_error(tmp_path, courier, change):
+    definitions = tariff_definitions()
+    if isinstance(change, dict) and "name" not in change and "steps" not in change:
+        definitions[courier] = {**definitions[courier], **change}
+    else:
+        definitions[courier] = change
+    with pytest.raises(ValueError):
+        read_couriers(write_tariffs(tmp_path / "tariffs.json", definitions))
+
+def test_invalid_file_keeps_the_tariffs(tmp_path, capsys):
+    previous = dict(tariff_file)
+    tariffs = dict(couriers)
+    definitions = tariff_definitions()
+    definitions["UBX"] = 5
+    tariff_file["path"] = write_tariffs(tmp_path / "tariffs.json", definitions)
+    try:
+        assert not refresh_tariffs(interval=0)
+        assert couriers == tariffs
+        assert tariff_file["mtime"] == os.stat(tariff_file["path"]).st_mtime
+        assert capsys.readouterr().err.count("Tariffs not reloaded") == 1
+        assert not refresh_tariffs(interval=0)          # Reported once
+        assert capsys.readouterr().err == ""
+    finally:
+        tariff_file.update(previous)
@@ -0,0 +1,35 @@
+import pytest
+from app.utils.courier_services import couriers
+
+WEIGHTS = [0.3, 0.501, 0.95, 1.234, 4.99, 5.001, 7.77, 12.345, 15.846, 16.185, 19.99]
+
+# Totals of the per-courier cost functions that the tariff tables replaced
+FORMER_TOTALS = {
+    ("UBX", False): [22.59, 25.91, 28.13, 32.18, 114.89, 104.06, 158.91, 230.4, 294.34, 300.52, 369.99],
+    ("MBX", False): [17.07, 23.19, 34.66, 43.26, 149.3, 152.17, 229.55, 325.85, 416.14, 423.87, 521.9],
+    ("ABX", False): [19.37, 23.25, 32.11, 39.91, 136.13, 121.8, 183.05, 246.23, 314.02, 319.82, 393.41],
+    ("GPR", False): [26.91, 26.91, 28.02, 34.9, 125.93, 96.31, 146.87, 230.4, 294.34, 300.52, 369.99],
+    ("PMO", False): [14.95, 21.16, 28.24, 33.55, 99.06, 100.83, 148.64, 230.08, 292.05, 297.36, 364.65],
+    ("UYC", False): [20.59, 14.81, 24.49, 30.63, 111.68, 109.1, 167.28, 252.63, 323.14, 329.97, 406.6],
+    ("USX", False): [5.81, 11.62, 19.37, 25.17, 96.83, 98.77, 151.05, 240.13, 307.92, 313.72, 387.31],
+    ("XUR", False): [19.92, 28.22, 36.52, 36.52, 102.91, 111.21, 161.01, 244.01, 302.1, 310.4, 385.1],
+    ("GBX", False): [11.3, 16.19, 27.13, 34.04, 125.48, 125.75, 193.16, 274.48, 351.2, 358.63, 441.99],
+    ("MLT", False): [11.94, 16.59, 26.97, 33.54, 120.41, 104.61, 159.77, 237.25, 285.56, 291.57, 358.93],
+    ("BBX", False): [11.53, 16.64, 27.08, 30.8, 98.32, 92.99, 141.71, 194.89, 248.74, 253.95, 312.48],
+    ("UBX", True): [15.96, 15.96, 15.96, 18.52, 59.67, 59.79, 90.12, 140.25, 178.61, 182.31, 224.0],
+    ("MBX", True): [5.79, 7.99, 12.9, 16.02, 57.17, 57.29, 87.62, 137.75, 176.11, 179.81, 221.5],
+    ("GPR", True): [7.97, 7.97, 12.62, 16.39, 66.27, 66.41, 103.18, 163.93, 210.42, 214.92, 265.45],
+    ("PMO", True): [14.95, 14.95, 14.95, 24.9, 54.75, 64.69, 84.58, 134.33, 164.17, 174.12, 203.97],
+    ("UYC", True): [19.09, 13.31, 22.99, 29.13, 110.18, 107.6, 165.78, 251.13, 321.64, 328.47, 405.1],
+    ("USX", True): [3.49, 6.97, 11.62, 15.11, 58.1, 59.26, 90.63, 144.08, 184.75, 188.23, 232.39],
+    ("XUR", True): [6.64, 13.28, 19.92, 19.92, 73.04, 79.68, 119.51, 185.91, 232.39, 239.03, 298.78],
+    ("GBX", True): [6.65, 9.1, 14.56, 18.02, 63.74, 63.87, 97.58, 153.28, 195.89, 200.01, 246.33],
+    ("MLT", True): [3.98, 6.65, 12.62, 16.39, 66.27, 66.41, 103.18, 163.93, 210.43, 214.92, 265.45],
+    ("BBX", True): [3.29, 5.49, 10.4, 13.52, 54.67, 54.79, 85.12, 135.25, 173.61, 177.31, 219.0],
+}
+
+@pytest.mark.parametrize("courier, book_cd", sorted(FORMER_TOTALS))
+def test_tables_match_the_former_cost_functions(courier, book_cd):
+    cost_function = couriers[courier]["cost_function"]
+    totals = [cost_function(weight, book_cd=book_cd) for weight in WEIGHTS]
+    assert totals == FORMER_TOTALS[courier, book_cd]
@@ -0,0 +1,25 @@
+import pickle
+import pytest
+from app.models.classes import TransportCost
+
+def test_total_is_the_sum_of_the_rounded_parts():
+    cost = TransportCost(handling=4.5, freight=10.005)
+    assert cost.cents[4] == sum(cost.cents[:4])
+    assert cost.total == round(cost.handling + cost.freight + cost.tax + cost.TFSPU, 2)
+    assert TransportCost.total_of(4.5, 10.005) == cost.total
+
+def test_sums_are_exact_in_cents():
+    # 0.1 + 0.2 is not 0.3 in floats, but the cents add up exactly
+    total = sum((TransportCost(0.1, 0.0) for _ in range(3)), TransportCost.zero())
+    assert total.handling == 0.3
+    many = sum((TransportCost(1.01, 2.37) for _ in range(1000)), TransportCost.zero())
+    assert many.cents == tuple(1000 * cents for cents in TransportCost(1.01, 2.37).cents)
+
+def test_costs_are_immutable_and_pickle_by_cents():
+    cost = TransportCost(3.0, 7.77)
+    with pytest.raises(AttributeError):
+        cost.cents = (0, 0, 0, 0, 0)
+    copy = pickle.loads(pickle.dumps(cost))
+    assert copy.cents == cost.cents
+    with pytest.raises(TypeError):
+        cost + 1.0